@@ -1,6 +1,24 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Category, Product, CartItem, Order, CustomUser
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from .models import (
+    Category,
+    Product,
+    CartItem,
+    Order,
+    OrderItem,
+    CustomUser,
+    DailyCategorySales,
+    DailyProductSales,
+    Job,
+)
+from .pagination import EstimatedCountPaginator
+from .reports import sales_dashboard
+from .exports import EXPORT_FORMATS
+from .search import filter_products
 
 admin.site.site_header = "Imperial Gems Control Panel"
 admin.site.site_title = "Imperial Gems | Admin"
@@ -44,24 +62,161 @@ class CustomUserAdmin(UserAdmin):
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ("name", "slug")
+    search_fields = ("name", "slug")
+    ordering = ("name",)
     prepopulated_fields = {"slug": ("name",)}
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ("name", "category", "price")
+    list_display = ("name", "category", "price", "stock")
     list_filter = ("category",)
+    list_select_related = ("category",)
     search_fields = ("name", "description")
+    # Стабильные страницы списка и автодополнения; индекс product_name_id_idx
+    ordering = ("name", "id")
     prepopulated_fields = {"slug": ("name",)}
+    autocomplete_fields = ("category",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # Полнотекстовый индекс вместо ILIKE '%...%' по описанию
+        if not search_term.strip():
+            return queryset, False
+        return filter_products(queryset, search_term), False
 
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
-    list_display = ("product", "quantity")
+    list_display = ("user", "product", "quantity", "added_at")
+    list_select_related = ("user", "product")
+    autocomplete_fields = ("user", "product")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    fields = ("product", "quantity", "unit_price")
+    readonly_fields = ("product", "quantity", "unit_price")
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("product")
+
+
+def _export_response(queryset, fmt):
+    rows, content_type = EXPORT_FORMATS[fmt]
+    response = StreamingHttpResponse(rows(queryset), content_type=content_type)
+    filename = f"orders-{timezone.now():%Y%m%d-%H%M%S}.{fmt}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@admin.action(description="Export selected orders as CSV")
+def export_orders_csv(modeladmin, request, queryset):
+    return _export_response(queryset, "csv")
+
+
+@admin.action(description="Export selected orders as JSON Lines")
+def export_orders_jsonl(modeladmin, request, queryset):
+    return _export_response(queryset, "jsonl")
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ("full_name", "email", "phone", "created_at")
+    actions = [export_orders_csv, export_orders_jsonl]
+    list_display = (
+        "full_name",
+        "user",
+        "email",
+        "phone",
+        "item_count",
+        "total",
+        "created_at",
+    )
+    list_select_related = ("user",)
     search_fields = ("full_name", "email")
-    readonly_fields = ("created_at",)
+    autocomplete_fields = ("user",)
+    readonly_fields = ("total", "item_count", "created_at")
+    date_hierarchy = "created_at"
+    inlines = [OrderItemInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class ReadOnlyRollupAdmin(admin.ModelAdmin):
+    date_hierarchy = "date"
+    list_display_links = None
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(ReadOnlyRollupAdmin):
+    list_display = ("date", "product", "quantity", "revenue")
+    list_select_related = ("product",)
+    ordering = ("-date", "-revenue")
+
+
+@admin.register(DailyCategorySales)
+class DailyCategorySalesAdmin(ReadOnlyRollupAdmin):
+    list_display = ("date", "category", "quantity", "revenue")
+    list_select_related = ("category",)
+    list_filter = ("category",)
+    ordering = ("-date", "-revenue")
+
+    def get_urls(self):
+        return [
+            path(
+                "dashboard/",
+                self.admin_site.admin_view(self.dashboard_view),
+                name="jewelry_sales_dashboard",
+            ),
+        ] + super().get_urls()
+
+    def dashboard_view(self, request):
+        try:
+            days = min(max(int(request.GET.get("days", 30)), 1), 366)
+        except ValueError:
+            days = 30
+        context = {
+            **self.admin_site.each_context(request),
+            **sales_dashboard(days),
+            "title": "Sales dashboard",
+            "days": days,
+            "opts": self.model._meta,
+        }
+        return TemplateResponse(request, "admin/jewelry/sales_dashboard.html", context)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "attempts", "run_at", "finished_at")
+    list_filter = ("status", "kind")
+    readonly_fields = [field.name for field in Job._meta.fields]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ["retry_now"]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Retry selected jobs now")
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.PENDING, run_at=timezone.now(), attempts=0, finished_at=None
+        )
+        self.message_user(request, f"{updated} jobs queued for retry")
@@ -0,0 +1,206 @@
+import hashlib
+import json
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+
+from .catalog import apply_catalog_filters, get_nav_categories, parse_catalog_filters
+from .models import Product
+from .page_cache import get_versions
+from .pagination import (
+    DEFAULT_PRODUCT_ORDERING,
+    PRODUCT_ORDERINGS,
+    InvalidCursor,
+    keyset_iterate,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+API_DEFAULT_LIMIT = 100
+API_MAX_LIMIT = 2000
+API_CHUNK_SIZE = 200
+API_MAX_AGE = 60
+
+# Поле в ответе -> поле в .values()
+PRODUCT_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "slug": "slug",
+    "description": "description",
+    "price": "price",
+    "image": "image",
+    "category": "category__slug",
+}
+DEFAULT_PRODUCT_FIELDS = ("id", "name", "slug", "price", "category")
+CATEGORY_FIELDS = ("id", "name", "slug", "image", "product_count")
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+
+    def dumps(value):
+        return orjson.dumps(value, default=_default)
+
+else:
+
+    def dumps(value):
+        return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+
+def _media_url(name):
+    return default_storage.url(name) if name else None
+
+
+def _api_error(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def _requested_fields(request, allowed, default):
+    raw = request.GET.get("fields")
+    if not raw:
+        return list(default)
+    fields = [field.strip() for field in raw.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(fields))
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get("limit", API_DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, API_MAX_LIMIT))
+
+
+def _etag(request, names):
+    key = "|".join([request.get_full_path(), *get_versions(names)])
+    return f'"{hashlib.md5(key.encode()).hexdigest()}"'
+
+
+def _not_modified(request, etag):
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+    return None
+
+
+def _stream(rows, tail):
+    """
+    {"results": [...], <tail>} кусками по API_CHUNK_SIZE строк по мере
+    чтения rows. tail() вызывается, когда rows исчерпаны.
+    """
+    yield b'{"results":['
+    chunk = []
+    separator = b""
+    for row in rows:
+        chunk.append(dumps(row))
+        if len(chunk) == API_CHUNK_SIZE:
+            yield separator + b",".join(chunk)
+            chunk, separator = [], b","
+    if chunk:
+        yield separator + b",".join(chunk)
+    # tail кодируется как объект и дописывается без открывающей скобки
+    yield b"]," + dumps(tail())[1:]
+
+
+def _cacheable(response, etag):
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=API_MAX_AGE)
+    return response
+
+
+def products(request):
+    """
+    /api/products/?fields=id,name,price&sort=price&limit=500&cursor=...
+    Фильтры как в каталоге: category, min_price, max_price.
+    """
+    try:
+        fields = _requested_fields(request, PRODUCT_FIELDS, DEFAULT_PRODUCT_FIELDS)
+        limit = _limit(request)
+    except ValueError as exc:
+        return _api_error(str(exc))
+
+    sort = request.GET.get("sort", DEFAULT_PRODUCT_ORDERING)
+    if sort not in PRODUCT_ORDERINGS:
+        return _api_error(f"Unknown sort: {sort}")
+
+    etag = _etag(request, ["nav", "listing"])
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    ordering = PRODUCT_ORDERINGS[sort]
+    keys = {field.lstrip("-") for field in ordering}
+    columns = {PRODUCT_FIELDS[field] for field in fields} | keys
+    queryset = apply_catalog_filters(
+        Product.objects.all(), parse_catalog_filters(request.GET)
+    ).values(*columns)
+
+    try:
+        page_rows, page = keyset_iterate(
+            queryset,
+            ordering,
+            request.GET.get("cursor"),
+            limit,
+            chunk_size=API_CHUNK_SIZE,
+        )
+    except InvalidCursor:
+        return _api_error("Invalid cursor")
+
+    def rows():
+        for values in page_rows:
+            row = {field: values[PRODUCT_FIELDS[field]] for field in fields}
+            if "image" in row:
+                row["image"] = _media_url(row["image"])
+            yield row
+
+    def tail():
+        return {
+            "next_cursor": page.next_cursor,
+            "previous_cursor": page.previous_cursor,
+        }
+
+    response = StreamingHttpResponse(
+        _stream(rows(), tail), content_type="application/json"
+    )
+    return _cacheable(response, etag)
+
+
+def categories(request):
+    """
+    /api/categories/ — из закэшированного меню категорий, без запросов к БД.
+    """
+    try:
+        fields = _requested_fields(request, CATEGORY_FIELDS, CATEGORY_FIELDS)
+    except ValueError as exc:
+        return _api_error(str(exc))
+
+    etag = _etag(request, ["nav"])
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    rows = []
+    for category in get_nav_categories():
+        row = {field: getattr(category, field) for field in fields}
+        if "image" in row:
+            row["image"] = _media_url(str(row["image"]))
+        rows.append(row)
+
+    response = StreamingHttpResponse(
+        _stream(rows, lambda: {"count": len(rows)}), content_type="application/json"
+    )
+    return _cacheable(response, etag)
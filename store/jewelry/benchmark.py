@@ -0,0 +1,345 @@
+import json
+import platform
+import random
+import subprocess
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .catalog import invalidate_catalog
+from .models import CartItem, Category, CustomUser, Order, OrderItem, Product
+from .search import index_products
+
+BENCHMARK_PASSWORD = "benchmark"
+WORDS = (
+    "gold silver platinum diamond ruby emerald sapphire pearl opal topaz "
+    "classic vintage modern elegant delicate bold twisted braided halo solitaire"
+).split()
+KINDS = ("ring", "necklace", "bracelet", "earrings", "pendant", "brooch", "anklet")
+
+
+def local_caches():
+    """
+    Те же алиасы кэшей, но в памяти процесса: тестовые данные не должны
+    попадать в общий Redis/Memcached витрины, а clear_caches — чистить его.
+    """
+    return override_settings(
+        CACHES={
+            alias: {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": f"benchmark-{alias}",
+            }
+            for alias in settings.CACHES
+        }
+    )
+
+
+def clear_caches():
+    for backend in caches.all():
+        backend.clear()
+
+
+def generate_data(
+    categories=10, products=1000, users=100, cart_items=500, orders=500, seed=42
+):
+    """
+    Детерминированный набор данных: один и тот же seed даёт одни и те же
+    строки, поэтому результаты сравнимы между коммитами. Всё через
+    bulk_create; кэши каталога и поисковый индекс пересобираются в конце.
+    """
+    rng = random.Random(seed)
+    category_objs = Category.objects.bulk_create(
+        Category(name=f"{kind.title()}s {i}", slug=f"{kind}s-{i}")
+        for i, kind in ((i, KINDS[i % len(KINDS)]) for i in range(categories))
+    )
+
+    product_objs = []
+    for i in range(products):
+        words = rng.sample(WORDS, 2)
+        kind = rng.choice(KINDS)
+        product_objs.append(
+            Product(
+                name=f"{words[0].title()} {words[1]} {kind} {i}",
+                slug=f"{words[0]}-{words[1]}-{kind}-{i}",
+                description=" ".join(rng.choices(WORDS, k=30)),
+                price=Decimal(rng.randint(500, 500_000)) / 100,
+                category=rng.choice(category_objs),
+            )
+        )
+    product_objs = Product.objects.bulk_create(product_objs, batch_size=1000)
+
+    # Хэш один на всех: make_password на каждого пользователя — это минуты
+    password = make_password(BENCHMARK_PASSWORD)
+    user_objs = CustomUser.objects.bulk_create(
+        (
+            CustomUser(
+                username=f"user{i}",
+                email=f"user{i}@example.com",
+                phone=f"{5550000000 + i}",
+                password=password,
+            )
+            for i in range(users)
+        ),
+        batch_size=1000,
+    )
+
+    pairs = set()
+    while user_objs and len(pairs) < min(cart_items, users * products):
+        pairs.add((rng.choice(user_objs).id, rng.choice(product_objs).id))
+    CartItem.objects.bulk_create(
+        (
+            CartItem(user_id=user_id, product_id=product_id, quantity=rng.randint(1, 3))
+            for user_id, product_id in sorted(pairs)
+        ),
+        batch_size=1000,
+    )
+
+    now = timezone.now()
+    order_objs = Order.objects.bulk_create(
+        (
+            Order(
+                full_name="Bench Customer",
+                email=f"customer{i}@example.com",
+                phone="5550000000",
+                country="Country",
+                region="Region",
+                city="City",
+                postal_code="12345",
+                address="1 Main Street",
+            )
+            for i in range(orders)
+        ),
+        batch_size=1000,
+    )
+    items = []
+    for order in order_objs:
+        order.total = Decimal("0.00")
+        for product in rng.sample(product_objs, min(3, len(product_objs))):
+            quantity = rng.randint(1, 2)
+            items.append(
+                OrderItem(
+                    order=order,
+                    product=product,
+                    quantity=quantity,
+                    unit_price=product.price,
+                )
+            )
+            order.total += quantity * product.price
+        order.created_at = now - timedelta(minutes=rng.randint(1, 60 * 24 * 90))
+    Order.objects.bulk_update(order_objs, ["total", "created_at"], batch_size=1000)
+    OrderItem.objects.bulk_create(items, batch_size=1000)
+
+    index_products()
+    clear_caches()
+    invalidate_catalog()
+    return {
+        "categories": len(category_objs),
+        "products": len(product_objs),
+        "users": len(user_objs),
+        "cart_items": len(pairs),
+        "orders": len(order_objs),
+        "order_items": len(items),
+    }
+
+
+def storefront_routes():
+    """
+    Список (название, метод, url, данные, нужен ли вход) для всех страниц из
+    urls.py, кроме logout и оформления заказа (они меняют набор данных между
+    прогонами), и пользователь, от имени которого идут запросы со входом.
+    """
+    category = Category.objects.order_by("id").first()
+    product = Product.objects.order_by("id").first()
+    user = CustomUser.objects.order_by("id").first()
+    cart_product = (
+        CartItem.objects.filter(user=user)
+        .order_by("id")
+        .values_list("product_id", flat=True)
+        .first()
+        or product.id
+    )
+    query = product.name.split()[0]
+    update = json.dumps({"changes": [{"product_id": cart_product, "quantity": 2}]})
+    return [
+        ("home", "get", reverse("home"), None, False),
+        ("products", "get", reverse("products"), None, False),
+        ("products_sorted", "get", reverse("products") + "?sort=-name", None, False),
+        (
+            "products_filtered",
+            "get",
+            reverse("products") + f"?category={category.slug}&min_price=100",
+            None,
+            False,
+        ),
+        ("category", "get", reverse("category", args=[category.slug]), None, False),
+        (
+            "product_detail",
+            "get",
+            reverse("product_detail", args=[product.slug]),
+            None,
+            False,
+        ),
+        ("search", "get", reverse("search") + f"?q={query}", None, False),
+        ("search_api", "get", reverse("search_api") + f"?q={query}", None, False),
+        ("api_products", "get", reverse("api_products") + "?limit=500", None, False),
+        ("api_categories", "get", reverse("api_categories"), None, False),
+        ("about", "get", reverse("about"), None, False),
+        ("contacts", "get", reverse("contacts"), None, False),
+        ("login", "get", reverse("login"), None, False),
+        ("register", "get", reverse("register"), None, False),
+        ("thank_you", "get", reverse("thank_you"), None, False),
+        ("cart_guest", "get", reverse("cart"), None, False),
+        ("cart", "get", reverse("cart"), None, True),
+        ("checkout", "get", reverse("checkout"), None, True),
+        (
+            "add_to_cart",
+            "get",
+            reverse("add_to_cart", args=[cart_product]),
+            None,
+            True,
+        ),
+        ("update_cart", "post", reverse("update_cart"), update, True),
+        (
+            "update_cart_item",
+            "post",
+            reverse("update_cart_item", args=[cart_product]),
+            {"quantity": 1},
+            True,
+        ),
+    ], user
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+def measure(client, method, url, data, iterations, warmup, cold_cache=False):
+    send = getattr(client, method)
+    kwargs = {}
+    if isinstance(data, str):
+        kwargs["content_type"] = "application/json"
+    for _ in range(warmup):
+        send(url, data, **kwargs)
+
+    timings, queries, statuses = [], [], set()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if cold_cache:
+            clear_caches()
+        # Запросы считаются по всем базам, включая реплики
+        with ExitStack() as stack:
+            captured = [
+                stack.enter_context(CaptureQueriesContext(conn))
+                for conn in connections.all()
+            ]
+            request_started = time.perf_counter()
+            response = send(url, data, **kwargs)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            timings.append((time.perf_counter() - request_started) * 1000)
+        queries.append(sum(len(context) for context in captured))
+        statuses.add(response.status_code)
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        "url": url,
+        "method": method.upper(),
+        "requests": iterations,
+        "status": sorted(statuses),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "queries_mean": round(sum(queries) / len(queries), 2),
+        "queries_max": max(queries),
+        "throughput_rps": round(iterations / elapsed, 1) if elapsed else None,
+    }
+
+
+def run_benchmark(iterations=50, warmup=5, only=None, cold_cache=False):
+    routes, user = storefront_routes()
+    guest = Client()
+    member = Client()
+    member.force_login(user)
+
+    results = {}
+    for name, method, url, data, needs_login in routes:
+        if only and name not in only:
+            continue
+        results[name] = measure(
+            member if needs_login else guest,
+            method,
+            url,
+            data,
+            iterations,
+            warmup,
+            cold_cache,
+        )
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "commit": commit or None,
+        "database": connection.vendor,
+        "django": django.get_version(),
+        "python": platform.python_version(),
+        "timestamp": timezone.now().isoformat(),
+    }
+
+
+def compare(current, baseline, threshold=10.0):
+    """
+    Строки сравнения с прошлым прогоном: (маршрут, p95 было, p95 стало,
+    изменение в %, запросы было, запросы стало, регрессия ли).
+    Регрессия — p95 вырос больше чем на threshold % или запросов стало больше.
+    """
+    rows = []
+    for name, result in current["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if before is None:
+            continue
+        change = (
+            (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+            if before["p95_ms"]
+            else 0.0
+        )
+        regressed = change > threshold or result["queries_max"] > before["queries_max"]
+        rows.append(
+            (
+                name,
+                before["p95_ms"],
+                result["p95_ms"],
+                change,
+                before["queries_max"],
+                result["queries_max"],
+                regressed,
+            )
+        )
+    return rows
@@ -0,0 +1,275 @@
+import json
+from decimal import Decimal
+
+from django.core import signing
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+
+from .models import CartItem, Product
+
+LINE_TOTAL = ExpressionWrapper(
+    F("quantity") * F("product__price"),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+ZERO = Decimal("0.00")
+
+ANONYMOUS_CART_COOKIE = "cart"
+ANONYMOUS_CART_SALT = "jewelry.cart"
+ANONYMOUS_CART_MAX_AGE = 60 * 60 * 24 * 30
+ANONYMOUS_CART_MAX_LINES = 50
+# Потолок количества в одной строке корзины: и для заданного, и для
+# накопленного добавлениями. Сумма строки не переполняет колонку, а
+# повторные клики или подделанные запросы не соберут 10**9 колец
+CART_MAX_QUANTITY = 99
+
+
+def cart_items_for(user):
+    return CartItem.objects.filter(user=user)
+
+
+def get_cart_lines(user):
+    """
+    Позиции корзины с товаром в одном JOIN и посчитанной в SQL суммой строки.
+    """
+    return (
+        cart_items_for(user)
+        .select_related("product")
+        .annotate(line_total=LINE_TOTAL)
+        .order_by("added_at", "id")
+    )
+
+
+def get_cart_total(user):
+    return cart_items_for(user).aggregate(
+        total=Coalesce(Sum(LINE_TOTAL), ZERO, output_field=LINE_TOTAL.output_field)
+    )["total"]
+
+
+def get_cart_summary(user):
+    """
+    Количество товаров и сумма корзины одним агрегатом, без загрузки строк.
+    """
+    summary = cart_items_for(user).aggregate(
+        count=Coalesce(Sum("quantity"), 0),
+        total=Coalesce(Sum(LINE_TOTAL), ZERO, output_field=LINE_TOTAL.output_field),
+    )
+    return summary["count"], summary["total"]
+
+
+def _upsert_cart_items(connection, user_id, items):
+    table = CartItem._meta.db_table
+    quote = connection.ops.quote_name
+    now = timezone.now()
+    rows = ", ".join(["(%s, %s, %s, %s)"] * len(items))
+    params = []
+    for product_id, quantity in items:
+        params += [user_id, product_id, quantity, now]
+    # LEAST в Postgres, скалярный MIN с несколькими аргументами в SQLite
+    least = "LEAST" if connection.vendor == "postgresql" else "MIN"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(table)} (user_id, product_id, quantity, added_at) "
+            f"VALUES {rows} "
+            "ON CONFLICT (user_id, product_id) DO UPDATE "
+            f"SET quantity = {least}({quote(table)}.quantity + EXCLUDED.quantity, %s)",
+            [*params, CART_MAX_QUANTITY],
+        )
+
+
+def add_cart_items(user, items):
+    """
+    Прибавляет {product_id: quantity} к корзине одним
+    INSERT ... ON CONFLICT DO UPDATE SET quantity = quantity + EXCLUDED.quantity,
+    не выше CART_MAX_QUANTITY.
+    Без чтения перед записью, поэтому параллельные клики не теряются и не
+    требуют повторов. Товары должны существовать (иначе IntegrityError).
+    """
+    items = sorted(
+        (product_id, min(quantity, CART_MAX_QUANTITY))
+        for product_id, quantity in items.items()
+    )
+    if not items:
+        return
+    using = router.db_for_write(CartItem)
+    connection = connections[using]
+    if connection.vendor in ("postgresql", "sqlite"):
+        _upsert_cart_items(connection, user.pk, items)
+        return
+    # Прочие бэкенды: атомарный UPDATE через F(), вставка при его промахе
+    for product_id, quantity in items:
+        lines = CartItem.objects.using(using).filter(user=user, product_id=product_id)
+        increment = Least(F("quantity") + quantity, CART_MAX_QUANTITY)
+        if lines.update(quantity=increment):
+            continue
+        try:
+            with transaction.atomic(using=using):
+                CartItem.objects.using(using).create(
+                    user=user, product_id=product_id, quantity=quantity
+                )
+        except IntegrityError:
+            lines.update(quantity=increment)
+
+
+def clamp_quantity(value):
+    """
+    Количество из запроса: целое в пределах 0..CART_MAX_QUANTITY
+    (0 — удалить строку). Не число — ValueError/TypeError.
+    """
+    return max(0, min(int(value), CART_MAX_QUANTITY))
+
+
+def set_cart_item_quantity(user, product_id, quantity):
+    """
+    Одним UPDATE/DELETE; возвращает False, если такой строки нет.
+    """
+    lines = cart_items_for(user).filter(product_id=product_id)
+    if quantity >= 1:
+        return bool(lines.update(quantity=quantity))
+    return bool(lines.delete()[0])
+
+
+@transaction.atomic
+def apply_cart_changes(user, changes):
+    """
+    Применяет пачку изменений {product_id: quantity} к корзине пользователя:
+    quantity < 1 удаляет строку. Один bulk_update, один DELETE.
+    Возвращает изменённые строки (с line_total) по product_id.
+    """
+    items = {
+        item.product_id: item
+        for item in get_cart_lines(user)
+        .filter(product_id__in=list(changes))
+        .select_for_update(of=("self",))
+    }
+    to_update, to_delete = [], []
+    for product_id, quantity in changes.items():
+        item = items.get(product_id)
+        if item is None:
+            continue
+        if quantity >= 1:
+            item.quantity = quantity
+            item.line_total = quantity * item.product.price
+            to_update.append(item)
+        else:
+            to_delete.append(item.id)
+            del items[product_id]
+
+    if to_update:
+        CartItem.objects.bulk_update(to_update, ["quantity"])
+    if to_delete:
+        CartItem.objects.filter(id__in=to_delete).delete()
+    return items
+
+
+class AnonymousCart:
+    """
+    Корзина гостя в подписанной cookie: {product_id: quantity}.
+    Клики гостя не пишут ничего в БД; при входе корзина сливается
+    в CartItem (merge_anonymous_cart).
+    """
+
+    def __init__(self, request):
+        self.items = {}
+        self.modified = False
+        try:
+            raw = request.get_signed_cookie(
+                ANONYMOUS_CART_COOKIE,
+                salt=ANONYMOUS_CART_SALT,
+                max_age=ANONYMOUS_CART_MAX_AGE,
+            )
+            self.items = {
+                int(product_id): int(quantity)
+                for product_id, quantity in json.loads(raw).items()
+                if int(quantity) > 0
+            }
+        except (KeyError, signing.BadSignature, ValueError, TypeError, AttributeError):
+            pass
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def add(self, product_id, quantity=1):
+        if product_id not in self.items and len(self.items) >= ANONYMOUS_CART_MAX_LINES:
+            return
+        self.items[product_id] = min(
+            self.items.get(product_id, 0) + quantity, CART_MAX_QUANTITY
+        )
+        self.modified = True
+
+    def set(self, product_id, quantity):
+        if quantity >= 1:
+            self.items[product_id] = quantity
+        else:
+            self.items.pop(product_id, None)
+        self.modified = True
+
+    def remove(self, product_id):
+        self.items.pop(product_id, None)
+        self.modified = True
+
+    def clear(self):
+        self.items = {}
+        self.modified = True
+
+    def summary(self):
+        """
+        (количество, сумма) как у get_cart_summary; цены — одним запросом
+        по id, удалённые товары не считаются. Пустая корзина — без запросов.
+        """
+        if not self.items:
+            return 0, ZERO
+        prices = dict(
+            Product.objects.filter(id__in=list(self.items)).values_list("id", "price")
+        )
+        count, total = 0, ZERO
+        for product_id, price in prices.items():
+            count += self.items[product_id]
+            total += self.items[product_id] * price
+        return count, total
+
+    def lines(self):
+        """
+        Несохранённые CartItem с товарами одним запросом, в том же виде,
+        что и get_cart_lines(), чтобы шаблоны не различали корзины.
+        """
+        products = Product.objects.in_bulk(list(self.items))
+        lines = []
+        for product_id, quantity in self.items.items():
+            product = products.get(product_id)
+            if product is None:
+                continue
+            line = CartItem(product=product, quantity=quantity)
+            line.line_total = quantity * product.price
+            lines.append(line)
+        return lines
+
+    def save(self, response):
+        if not self.modified:
+            return response
+        if self.items:
+            response.set_signed_cookie(
+                ANONYMOUS_CART_COOKIE,
+                json.dumps(self.items),
+                salt=ANONYMOUS_CART_SALT,
+                max_age=ANONYMOUS_CART_MAX_AGE,
+                httponly=True,
+                samesite="Lax",
+            )
+        else:
+            response.delete_cookie(ANONYMOUS_CART_COOKIE, samesite="Lax")
+        return response
+
+
+def merge_anonymous_cart(user, anonymous_cart):
+    """
+    Переносит гостевую корзину в CartItem пользователя одним upsert:
+    количества складываются с уже лежащими в корзине.
+    """
+    if not anonymous_cart:
+        return
+    items = anonymous_cart.items
+    valid_ids = Product.objects.filter(id__in=list(items)).values_list("id", flat=True)
+    add_cart_items(user, {product_id: items[product_id] for product_id in valid_ids})
+    anonymous_cart.clear()
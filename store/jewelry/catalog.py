@@ -0,0 +1,189 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Category, Product
+from .page_cache import bump_versions
+from .popular import invalidate_popular_pool
+from .routers import cache_timeout
+
+NAV_CATEGORIES_CACHE_KEY = "jewelry:nav_categories"
+# Сигналы сбрасывают меню сразу; TTL — страховка от пропущенного сброса
+# (изменения в обход ORM, упавший процесс между коммитом и on_commit)
+NAV_CATEGORIES_TIMEOUT = 60 * 60
+
+
+def get_nav_categories():
+    """
+    Категории с количеством товаров для меню. Кэшируются на
+    NAV_CATEGORIES_TIMEOUT и сбрасываются сигналами после коммита
+    изменений Category/Product.
+    """
+    categories = cache.get(NAV_CATEGORIES_CACHE_KEY)
+    if categories is None:
+        categories = list(
+            Category.objects.annotate(product_count=Count("products")).order_by("name")
+        )
+        cache.set(
+            NAV_CATEGORIES_CACHE_KEY, categories, cache_timeout(NAV_CATEGORIES_TIMEOUT)
+        )
+    return categories
+
+
+def invalidate_nav_categories():
+    cache.delete(NAV_CATEGORIES_CACHE_KEY)
+
+
+# Ценовые диапазоны для фасетов: (от, до), верхняя граница не включается
+PRICE_BANDS = [
+    (Decimal("0"), Decimal("100")),
+    (Decimal("100"), Decimal("500")),
+    (Decimal("500"), Decimal("1000")),
+    (Decimal("1000"), Decimal("5000")),
+    (Decimal("5000"), None),
+]
+FACETS_BUILT_CACHE_KEY = "jewelry:facets:built"
+FACETS_TIMEOUT = 60 * 60 * 24
+
+
+def price_band(price):
+    price = Decimal(str(price))
+    for index, (low, high) in enumerate(PRICE_BANDS):
+        if price >= low and (high is None or price < high):
+            return index
+    return 0
+
+
+def _facet_key(category_id, band):
+    return f"jewelry:facets:{category_id}:{band}"
+
+
+def _build_facet_counts():
+    """
+    Один GROUP BY по (category, price) на весь каталог. Кладёт в кэш все
+    ячейки, включая нулевые, чтобы дальше их можно было менять через incr.
+    """
+    cells = {
+        _facet_key(category.id, band): 0
+        for category in get_nav_categories()
+        for band in range(len(PRICE_BANDS))
+    }
+    rows = Product.objects.values("category_id", "price").annotate(n=Count("id"))
+    for row in rows:
+        key = _facet_key(row["category_id"], price_band(row["price"]))
+        cells[key] = cells.get(key, 0) + row["n"]
+    cache.set_many(cells, FACETS_TIMEOUT + 60)
+    cache.set(FACETS_BUILT_CACHE_KEY, True, cache_timeout(FACETS_TIMEOUT))
+    return cells
+
+
+def get_facet_counts():
+    """
+    {(category_id, band): количество товаров}. Читается из кэша одним
+    get_many; пересчитывается только если кэш пуст.
+    """
+    categories = get_nav_categories()
+    keys = {
+        _facet_key(category.id, band): (category.id, band)
+        for category in categories
+        for band in range(len(PRICE_BANDS))
+    }
+    cached = cache.get_many([FACETS_BUILT_CACHE_KEY, *keys])
+    if FACETS_BUILT_CACHE_KEY not in cached:
+        cached = _build_facet_counts()
+    return {cell: cached.get(key, 0) for key, cell in keys.items()}
+
+
+def adjust_facet_count(category_id, price, delta):
+    try:
+        cache.incr(_facet_key(category_id, price_band(price)), delta)
+    except ValueError:
+        # Ячейки нет в кэше — пусть следующий запрос пересчитает всё
+        reset_facet_counts()
+
+
+def reset_facet_counts():
+    cache.delete(FACETS_BUILT_CACHE_KEY)
+
+
+def invalidate_catalog():
+    """
+    Сброс всех производных данных каталога после массовых изменений
+    (bulk_create/update не вызывают сигналы). Все страницы зависят от nav.
+    """
+    invalidate_nav_categories()
+    reset_facet_counts()
+    invalidate_popular_pool()
+    bump_versions("nav", "listing")
+
+
+# GET-параметры страниц каталога (фильтры, сортировка и курсор)
+CATALOG_PARAMS = ("category", "min_price", "max_price", "sort", "cursor")
+
+
+def parse_catalog_filters(params):
+    filters = {}
+    for name in ("min_price", "max_price"):
+        try:
+            value = Decimal(params.get(name, ""))
+        except InvalidOperation:
+            continue
+        if value.is_finite() and value >= 0:
+            filters[name] = value
+    if params.get("category"):
+        filters["category"] = params["category"]
+    return filters
+
+
+def apply_catalog_filters(queryset, filters):
+    if "category" in filters:
+        queryset = queryset.filter(category__slug=filters["category"])
+    if "min_price" in filters:
+        queryset = queryset.filter(price__gte=filters["min_price"])
+    if "max_price" in filters:
+        queryset = queryset.filter(price__lt=filters["max_price"])
+    return queryset
+
+
+def catalog_facets(filters, category=None):
+    """
+    Счётчики для боковой панели: по категориям (с учётом выбранного ценового
+    диапазона) и по ценовым диапазонам (с учётом выбранной категории).
+    """
+    counts = get_facet_counts()
+    categories = get_nav_categories()
+    if category is None and "category" in filters:
+        category = next((c for c in categories if c.slug == filters["category"]), None)
+
+    selected_band = None
+    for index, (low, high) in enumerate(PRICE_BANDS):
+        if filters.get("min_price") == low and filters.get("max_price") == high:
+            selected_band = index
+
+    bands = []
+    for index, (low, high) in enumerate(PRICE_BANDS):
+        if category is not None:
+            count = counts.get((category.id, index), 0)
+        else:
+            count = sum(counts.get((c.id, index), 0) for c in categories)
+        bands.append(
+            {
+                "min_price": low,
+                "max_price": high,
+                "count": count,
+                "active": index == selected_band,
+            }
+        )
+
+    category_facets = []
+    for c in categories:
+        if selected_band is not None:
+            count = counts.get((c.id, selected_band), 0)
+        else:
+            count = sum(
+                counts.get((c.id, index), 0) for index in range(len(PRICE_BANDS))
+            )
+        category_facets.append({"category": c, "count": count, "active": c == category})
+
+    return {"categories": category_facets, "price_bands": bands}
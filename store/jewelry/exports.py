@@ -0,0 +1,100 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from .models import OrderItem
+
+EXPORT_CHUNK_SIZE = 2000
+
+ORDER_COLUMNS = [
+    "id",
+    "created_at",
+    "full_name",
+    "email",
+    "phone",
+    "country",
+    "region",
+    "city",
+    "postal_code",
+    "address",
+    "total",
+]
+ITEM_COLUMNS = ["product_id", "product_name", "quantity", "unit_price", "line_total"]
+CSV_HEADER = [f"order_{column}" for column in ORDER_COLUMNS] + [
+    f"item_{column}" for column in ITEM_COLUMNS
+]
+
+
+class Echo:
+    """
+    Псевдо-файл для csv.writer: write() возвращает строку, а не пишет её.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_orders(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Заказы с позициями: iterator() читает заказы пачками по chunk_size,
+    позиции (с товаром) подгружаются одним запросом на пачку.
+    Память не зависит от общего числа заказов.
+    """
+    items = OrderItem.objects.select_related("product").only(
+        "order_id", "product_id", "product__name", "quantity", "unit_price"
+    )
+    return (
+        queryset.order_by("id")
+        .prefetch_related(Prefetch("order_items", queryset=items))
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def _order_values(order):
+    return [getattr(order, column) for column in ORDER_COLUMNS]
+
+
+def _item_values(item):
+    return [
+        item.product_id,
+        item.product.name,
+        item.quantity,
+        item.unit_price,
+        item.total_price(),
+    ]
+
+
+def csv_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Строки CSV: по одной на позицию заказа, поля заказа повторяются.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for order in iter_orders(queryset, chunk_size):
+        order_values = _order_values(order)
+        items = order.order_items.all()
+        if not items:
+            yield writer.writerow(order_values + [""] * len(ITEM_COLUMNS))
+        for item in items:
+            yield writer.writerow(order_values + _item_values(item))
+
+
+def jsonl_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    JSON Lines: один заказ на строку, позиции вложены списком.
+    """
+    for order in iter_orders(queryset, chunk_size):
+        record = dict(zip(ORDER_COLUMNS, _order_values(order)))
+        record["items"] = [
+            dict(zip(ITEM_COLUMNS, _item_values(item)))
+            for item in order.order_items.all()
+        ]
+        yield json.dumps(record, cls=DjangoJSONEncoder) + "\n"
+
+
+EXPORT_FORMATS = {
+    "csv": (csv_rows, "text/csv"),
+    "jsonl": (jsonl_rows, "application/x-ndjson"),
+}
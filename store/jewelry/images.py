@@ -0,0 +1,90 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .jobs import job_handler
+
+# Ширина производных картинок (высота — по пропорциям исходника)
+IMAGE_SIZES = {
+    "thumb": 160,
+    "card": 480,
+    "detail": 1024,
+}
+DEFAULT_FORMAT = "webp"
+FALLBACK_FORMAT = "jpeg"
+IMAGE_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 85, "optimize": True, "progressive": True},
+}
+
+
+def derivative_name(name, size, fmt=DEFAULT_FORMAT):
+    """
+    products/ring.jpg -> products/derivatives/ring_card.webp
+    """
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, "derivatives", f"{stem}_{size}.{fmt}")
+
+
+def derivative_names(name):
+    return [
+        derivative_name(name, size, fmt)
+        for size in IMAGE_SIZES
+        for fmt in IMAGE_FORMATS
+    ]
+
+
+def _prepare(image, fmt):
+    if fmt == "jpeg" and image.mode != "RGB":
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            return background
+        return image.convert("RGB")
+    if image.mode not in ("RGB", "RGBA"):
+        return image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    return image
+
+
+def generate_derivatives(name, overwrite=False, storage=default_storage):
+    """
+    Генерирует все размеры из IMAGE_SIZES в WebP и JPEG (fallback).
+    Возвращает список созданных файлов.
+    """
+    created = []
+    with storage.open(name, "rb") as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        original.load()
+
+    for size, width in IMAGE_SIZES.items():
+        resized = original.copy()
+        # Не увеличиваем картинки меньше нужной ширины
+        resized.thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+        for fmt, options in IMAGE_FORMATS.items():
+            path = derivative_name(name, size, fmt)
+            if storage.exists(path):
+                if not overwrite:
+                    continue
+                storage.delete(path)
+            buffer = BytesIO()
+            _prepare(resized, fmt).save(buffer, **options)
+            created.append(storage.save(path, ContentFile(buffer.getvalue())))
+    return created
+
+
+@job_handler("image_derivatives")
+def generate_derivatives_job(payload):
+    # Ошибка (файл ещё не доехал до хранилища, битая картинка) — повтор
+    # с backoff, после max_attempts задача остаётся в failed
+    generate_derivatives(payload["name"])
+
+
+def delete_derivatives(name, storage=default_storage):
+    for path in derivative_names(name):
+        if storage.exists(path):
+            storage.delete(path)
@@ -0,0 +1,113 @@
+from django.core.cache import cache
+from django.db import OperationalError, connections, router, transaction
+from django.db.models import F, Q
+
+from .models import Product
+from .page_cache import bump_versions
+from .routers import cache_timeout
+
+STOCK_CACHE_TIMEOUT = 60 * 10
+# Сколько ждать блокировку строки товара при резервировании (Postgres)
+STOCK_LOCK_TIMEOUT_MS = 2000
+# Ниже этого остатка карточка товара показывает «осталось N»
+LOW_STOCK = 5
+# В кэше нельзя хранить None: так отличаем «не учитывается» от промаха
+UNTRACKED = -1
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f"Not enough stock for products {product_ids}")
+        self.product_ids = product_ids
+
+
+class StockBusy(Exception):
+    """Строку товара дольше STOCK_LOCK_TIMEOUT_MS держит другой заказ."""
+
+
+def _stock_key(product_id):
+    return f"jewelry:stock:{product_id}"
+
+
+def get_stock_levels(product_ids):
+    """
+    {product_id: остаток или None, если остаток не учитывается}.
+    Читается из кэша одним get_many, промахи — одним запросом.
+    Для витрины; окончательная проверка — в reserve_stock.
+    """
+    keys = {_stock_key(product_id): product_id for product_id in product_ids}
+    cached = cache.get_many(keys)
+    levels = {keys[key]: value for key, value in cached.items()}
+    missing = [product_id for key, product_id in keys.items() if key not in cached]
+    if missing:
+        found = dict(Product.objects.filter(id__in=missing).values_list("id", "stock"))
+        levels.update(found)
+        cache.set_many(
+            {
+                _stock_key(product_id): UNTRACKED if stock is None else stock
+                for product_id, stock in found.items()
+            },
+            cache_timeout(STOCK_CACHE_TIMEOUT),
+        )
+    return {
+        product_id: None if level == UNTRACKED else level
+        for product_id, level in levels.items()
+    }
+
+
+def invalidate_stock(product_ids):
+    cache.delete_many([_stock_key(product_id) for product_id in product_ids])
+
+
+def _set_lock_timeout(using):
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL lock_timeout = {int(STOCK_LOCK_TIMEOUT_MS)}")
+
+
+def reserve_stock(quantities):
+    """
+    Списывает {product_id: количество} в текущей транзакции: по одному
+    UPDATE ... SET stock = stock - n WHERE stock >= n на товар, в порядке id
+    (без взаимных блокировок). Строки блокируются только до конца
+    транзакции оформления заказа, а не на время заполнения формы.
+    Товары с stock = NULL не учитываются и списываются всегда.
+    Если чего-то не хватает, бросает OutOfStock, если не дождались
+    блокировки — StockBusy; транзакция откатывается.
+    """
+    using = router.db_for_write(Product)
+    _set_lock_timeout(using)
+
+    short = []
+    for product_id, quantity in sorted(quantities.items()):
+        try:
+            updated = (
+                Product.objects.using(using)
+                .filter(Q(stock__isnull=True) | Q(stock__gte=quantity), id=product_id)
+                .update(stock=F("stock") - quantity)
+            )
+        except OperationalError as exc:
+            raise StockBusy(product_id) from exc
+        if not updated:
+            short.append(product_id)
+    if short:
+        raise OutOfStock(short)
+
+    # Новые остатки — в кэш и на витрину после коммита
+    rows = list(
+        Product.objects.using(using)
+        .filter(id__in=list(quantities), stock__isnull=False)
+        .values_list("id", "stock", "slug")
+    )
+
+    def publish():
+        cache.set_many(
+            {_stock_key(product_id): stock for product_id, stock, _ in rows},
+            cache_timeout(STOCK_CACHE_TIMEOUT),
+        )
+        low = [f"product:{slug}" for _, stock, slug in rows if stock <= LOW_STOCK]
+        if low:
+            bump_versions(*low)
+
+    transaction.on_commit(publish, using=using)
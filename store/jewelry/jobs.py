@@ -0,0 +1,228 @@
+import logging
+import random
+import traceback
+from datetime import timedelta
+from html import unescape
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_BATCH_SIZE = 50
+JOB_BACKOFF_BASE = 30
+JOB_BACKOFF_MAX = 60 * 60
+# Задача в статусе running дольше этого — воркер умер, отдаём другому
+JOB_STALE_AFTER = timedelta(minutes=10)
+# Как часто run_workers ищет такие задачи
+JOB_RELEASE_INTERVAL = 60
+
+# kind -> (функция, принимает ли пачку)
+_handlers = {}
+
+
+def job_handler(kind, batch=False):
+    """
+    Регистрирует обработчик задач вида kind. Обычный получает payload одной
+    задачи; пакетный (batch=True) — список payload и возвращает список
+    ошибок той же длины (None — задача выполнена).
+    """
+
+    def decorator(func):
+        _handlers[kind] = (func, batch)
+        return func
+
+    return decorator
+
+
+def enqueue(kind, payload, delay=None, max_attempts=5):
+    """
+    Кладёт задачу в очередь в текущей транзакции: если она откатится,
+    задачи не будет, а воркеры увидят её только после коммита.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    run_at = timezone.now() + (delay or timedelta())
+    return Job.objects.create(
+        kind=kind, payload=payload, run_at=run_at, max_attempts=max_attempts
+    )
+
+
+def backoff(attempts):
+    delay = min(JOB_BACKOFF_BASE * 2 ** (attempts - 1), JOB_BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def release_stale_jobs():
+    """
+    Возвращает в очередь задачи, зависшие в running. Зависание считается
+    попыткой: задача, которая роняет воркер, после max_attempts уходит в
+    failed, а не крутится по кругу. Возвращает число освобождённых задач.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - JOB_STALE_AFTER)
+    unlock = {
+        "attempts": F("attempts") + 1,
+        "locked_by": "",
+        "locked_at": None,
+        "last_error": "Worker stopped responding",
+    }
+    failed = stale.filter(attempts__gte=F("max_attempts") - 1).update(
+        status=Job.FAILED, finished_at=now, **unlock
+    )
+    if failed:
+        logger.error("%s stale jobs failed for good", failed)
+    return failed + stale.update(status=Job.PENDING, **unlock)
+
+
+def claim_jobs(worker, limit=JOB_BATCH_SIZE):
+    """
+    Забирает до limit готовых задач. Захват — UPDATE ... WHERE status =
+    'pending', поэтому два воркера не получат одну задачу; на Postgres
+    кандидаты выбираются с SKIP LOCKED, чтобы воркеры не ждали друг друга.
+    """
+    using = router.db_for_write(Job)
+    now = timezone.now()
+    with transaction.atomic(using=using):
+        candidates = Job.objects.using(using).filter(
+            status=Job.PENDING, run_at__lte=now
+        )
+        if connections[using].features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(
+            candidates.order_by("run_at", "id").values_list("id", flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        Job.objects.using(using).filter(id__in=ids, status=Job.PENDING).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now
+        )
+    return list(
+        Job.objects.using(using)
+        .filter(id__in=ids, status=Job.RUNNING, locked_by=worker, locked_at=now)
+        .order_by("run_at", "id")
+    )
+
+
+def _finish(job, error):
+    now = timezone.now()
+    job.attempts += 1
+    job.locked_by = ""
+    job.locked_at = None
+    job.last_error = error or ""
+    if error is None:
+        job.status = Job.DONE
+        job.finished_at = now
+    elif job.attempts >= job.max_attempts:
+        job.status = Job.FAILED
+        job.finished_at = now
+        logger.error("Job %s failed for good: %s", job, error)
+    else:
+        job.status = Job.PENDING
+        job.run_at = now + backoff(job.attempts)
+        logger.warning("Job %s failed, retrying at %s: %s", job, job.run_at, error)
+    return job
+
+
+def run_jobs(jobs):
+    """
+    Выполняет захваченные задачи: пакетные обработчики получают все задачи
+    своего вида сразу. Результаты пишутся одним bulk_update.
+    """
+    by_kind = {}
+    for job in jobs:
+        by_kind.setdefault(job.kind, []).append(job)
+
+    finished = []
+    for kind, group in by_kind.items():
+        handler, batch = _handlers.get(kind, (None, False))
+        if handler is None:
+            errors = [f"Unknown job kind: {kind}"] * len(group)
+        elif batch:
+            try:
+                errors = handler([job.payload for job in group])
+            except Exception:
+                errors = [traceback.format_exc()] * len(group)
+        else:
+            errors = []
+            for job in group:
+                try:
+                    handler(job.payload)
+                    errors.append(None)
+                except Exception:
+                    errors.append(traceback.format_exc())
+        finished += [_finish(job, error) for job, error in zip(group, errors)]
+
+    Job.objects.bulk_update(
+        finished,
+        [
+            "status",
+            "attempts",
+            "run_at",
+            "locked_by",
+            "locked_at",
+            "last_error",
+            "finished_at",
+        ],
+    )
+    return finished
+
+
+def run_pending(worker, limit=JOB_BATCH_SIZE):
+    jobs = claim_jobs(worker, limit)
+    if jobs:
+        run_jobs(jobs)
+    return len(jobs)
+
+
+@job_handler("email", batch=True)
+def deliver_emails(payloads):
+    """
+    Все письма пачки — через одно SMTP-соединение. Ошибка одного письма
+    не мешает остальным и не приводит к повторной отправке уже ушедших.
+    """
+    errors = []
+    with get_connection() as connection:
+        for payload in payloads:
+            message = EmailMessage(
+                subject=payload["subject"],
+                body=payload["body"],
+                from_email=payload.get("from_email") or settings.DEFAULT_FROM_EMAIL,
+                to=payload["to"],
+                reply_to=payload.get("reply_to"),
+                connection=connection,
+            )
+            try:
+                message.send()
+                errors.append(None)
+            except Exception:
+                errors.append(traceback.format_exc())
+    return errors
+
+
+def send_mail_later(subject, body, to, reply_to=None, from_email=None):
+    return enqueue(
+        "email",
+        {
+            "subject": subject,
+            "body": body,
+            "to": list(to),
+            "reply_to": list(reply_to) if reply_to else None,
+            "from_email": from_email,
+        },
+    )
+
+
+def send_contact_message(cleaned_data):
+    # ContactForm.clean_message экранирует HTML, письмо же текстовое
+    send_mail_later(
+        subject=f"Contact form: {cleaned_data['name']}",
+        body=unescape(cleaned_data["message"]),
+        to=[settings.CONTACT_EMAIL or settings.DEFAULT_FROM_EMAIL],
+        reply_to=[cleaned_data["email"]],
+    )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from jewelry.orders import BACKFILL_BATCH_SIZE, backfill_order_history
+
+
+class Command(BaseCommand):
+    help = "Link existing orders to customers by email and recount their items"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        last_id, batches = 0, 0
+        while True:
+            last_id = backfill_order_history(last_id, options["batch_size"])
+            if last_id is None:
+                break
+            batches += 1
+            self.stdout.write(f"Orders up to #{last_id} updated")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {batches} batches"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from jewelry.orders import BACKFILL_BATCH_SIZE, backfill_order_prices
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill in unit prices of order items placed before prices were recorded "
+        "and recompute those orders' totals"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        last_id, batches = 0, 0
+        while True:
+            last_id = backfill_order_prices(last_id, options["batch_size"])
+            if last_id is None:
+                break
+            batches += 1
+            self.stdout.write(f"Orders up to #{last_id} updated")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {batches} batches"))
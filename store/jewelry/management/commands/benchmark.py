@@ -0,0 +1,153 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from jewelry.benchmark import (
+    compare,
+    environment,
+    generate_data,
+    local_caches,
+    run_benchmark,
+)
+from jewelry.models import Product
+
+SCALES = {
+    "small": dict(categories=5, products=200, users=20, cart_items=100, orders=100),
+    "medium": dict(
+        categories=20, products=5000, users=500, cart_items=2000, orders=5000
+    ),
+    "large": dict(
+        categories=50, products=100_000, users=5000, cart_items=20000, orders=50000
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every storefront URL against a throwaway test database "
+        "filled with synthetic data. Reports p50/p95/p99 latency, queries per "
+        "request and throughput, optionally as JSON for comparing commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=SCALES, default="small")
+        for name in ("categories", "products", "users", "cart-items", "orders"):
+            parser.add_argument(f"--{name}", type=int, help="Override the scale")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--route", action="append", help="Only benchmark these routes"
+        )
+        parser.add_argument(
+            "--cold-cache",
+            action="store_true",
+            help="Clear the cache before every measured request",
+        )
+        parser.add_argument("-o", "--output", help="Write results as JSON")
+        parser.add_argument("--compare", help="Previous JSON results to compare to")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=10.0,
+            help="p95 slowdown in percent that counts as a regression",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the test database (and its data) between runs",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read {options['compare']}: {exc}")
+
+        scale = dict(SCALES[options["scale"]])
+        for name in scale:
+            if options[name] is not None:
+                scale[name] = options[name]
+
+        local = local_caches()
+        local.enable()
+        setup_test_environment()
+        # Как test runner: тестовая база плюс реплики-зеркала на неё
+        old_config = setup_databases(
+            verbosity=0, interactive=False, keepdb=options["keepdb"]
+        )
+        try:
+            if options["keepdb"] and Product.objects.exists():
+                dataset = {"reused": True}
+            else:
+                dataset = generate_data(seed=options["seed"], **scale)
+            self.stdout.write(f"Dataset ({connection.vendor}): {dataset}")
+            routes = run_benchmark(
+                iterations=options["iterations"],
+                warmup=options["warmup"],
+                only=options["route"],
+                cold_cache=options["cold_cache"],
+            )
+            results = {
+                "environment": environment(),
+                "scale": {**scale, "seed": options["seed"]},
+                "settings": {
+                    "iterations": options["iterations"],
+                    "warmup": options["warmup"],
+                    "cold_cache": options["cold_cache"],
+                },
+                "routes": routes,
+            }
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options["keepdb"])
+            teardown_test_environment()
+            local.disable()
+
+        self.report(results)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        if baseline is not None:
+            self.report_comparison(results, baseline, options["threshold"])
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'route':<20} {'status':<10} {'p50':>8} {'p95':>8} {'p99':>8} "
+            f"{'queries':>8} {'req/s':>8}"
+        )
+        for name, result in results["routes"].items():
+            status = ",".join(str(code) for code in result["status"])
+            self.stdout.write(
+                f"{name:<20} {status:<10} {result['p50_ms']:>8.2f} "
+                f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                f"{result['queries_max']:>8} {result['throughput_rps']:>8.1f}"
+            )
+
+    def report_comparison(self, results, baseline, threshold):
+        regressions = 0
+        for name, before, after, change, q_before, q_after, regressed in compare(
+            results, baseline, threshold
+        ):
+            line = (
+                f"{name:<20} p95 {before:.2f} -> {after:.2f} ms ({change:+.1f}%), "
+                f"queries {q_before} -> {q_after}"
+            )
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(f"{regressions} routes regressed")
+        self.stdout.write(self.style.SUCCESS("No regressions"))
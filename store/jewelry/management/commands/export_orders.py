@@ -0,0 +1,59 @@
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from jewelry.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS
+from jewelry.models import Order
+
+
+def _parse_date(value):
+    try:
+        return timezone.make_aware(datetime.strptime(value, "%Y-%m-%d"))
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Export orders with their items as CSV or JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+        parser.add_argument("--month", help="Export a single month, YYYY-MM")
+        parser.add_argument("--since", help="Orders created on or after YYYY-MM-DD")
+        parser.add_argument("--until", help="Orders created before YYYY-MM-DD")
+        parser.add_argument("--output", "-o", help="Output file (default: stdout)")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        since, until = options["since"], options["until"]
+        if options["month"]:
+            try:
+                start = datetime.strptime(options["month"], "%Y-%m")
+            except ValueError:
+                raise CommandError(
+                    f"Invalid month {options['month']!r}, expected YYYY-MM"
+                )
+            end = start.replace(
+                year=start.year + start.month // 12, month=start.month % 12 + 1
+            )
+            since, until = f"{start:%Y-%m-%d}", f"{end:%Y-%m-%d}"
+        if since:
+            orders = orders.filter(created_at__gte=_parse_date(since))
+        if until:
+            orders = orders.filter(created_at__lt=_parse_date(until))
+
+        rows, _ = EXPORT_FORMATS[options["format"]]
+        output = (
+            open(options["output"], "w", newline="", encoding="utf-8")
+            if options["output"]
+            else sys.stdout
+        )
+        try:
+            for row in rows(orders, options["chunk_size"]):
+                output.write(row)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,64 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+
+from jewelry.images import generate_derivatives
+from jewelry.models import Category, Product
+
+
+def _generate(name, overwrite):
+    try:
+        return name, len(generate_derivatives(name, overwrite=overwrite)), None
+    except (OSError, ValueError) as exc:
+        return name, 0, str(exc)
+
+
+class Command(BaseCommand):
+    help = "Generate thumb/card/detail WebP and JPEG derivatives for existing images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes",
+        )
+        parser.add_argument(
+            "--overwrite",
+            action="store_true",
+            help="Regenerate derivatives that already exist",
+        )
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in (Product, Category):
+            names.update(
+                model.objects.exclude(image="")
+                .exclude(image__isnull=True)
+                .values_list("image", flat=True)
+            )
+
+        created = failed = 0
+        with ProcessPoolExecutor(
+            max_workers=options["workers"], initializer=django.setup
+        ) as executor:
+            futures = [
+                executor.submit(_generate, name, options["overwrite"])
+                for name in sorted(names)
+            ]
+            for future in as_completed(futures):
+                name, count, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+                else:
+                    created += count
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {len(names)} images: {created} derivatives created, "
+                f"{failed} failed"
+            )
+        )
@@ -0,0 +1,269 @@
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from functools import reduce
+from itertools import islice
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from jewelry.catalog import invalidate_catalog
+from jewelry.models import Category, ImportCheckpoint, Product
+from jewelry.page_cache import bump_versions
+from jewelry.search import index_products
+
+UPDATE_FIELDS = ["name", "description", "price", "category"]
+# Место под суффикс -N в slug, который не влезает в поле целиком
+SLUG_SUFFIX_RESERVE = 8
+
+
+def clean_field(model, name, value):
+    """
+    Проверка значения валидаторами поля модели (max_length, max_digits,
+    формат slug...), чтобы одна плохая строка не роняла bulk_create пачки.
+    """
+    field = model._meta.get_field(name)
+    try:
+        value = field.clean(value, None)
+        if field.max_length and len(str(value)) > field.max_length:
+            raise ValidationError(
+                f"at most {field.max_length} characters allowed (got {len(value)})"
+            )
+    except ValidationError as exc:
+        raise ValidationError(f"{name}: {' '.join(exc.messages)}")
+    return value
+
+
+def read_rows(path, fmt):
+    """
+    Построчное чтение CSV/JSONL: в памяти только текущая строка.
+    """
+    with open(path, newline="", encoding="utf-8") as source:
+        if fmt == "csv":
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import products from a CSV or JSONL file. Columns: name, description, "
+        "price, category (slug), optional slug and image. Rows with a slug "
+        "update the existing product with that slug; rows without one get a "
+        "new unique slug derived from the name."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint name (default: absolute path of the file)",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and start from the first row",
+        )
+        parser.add_argument(
+            "--create-categories",
+            action="store_true",
+            help="Create categories that do not exist instead of skipping rows",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"File not found: {path}")
+        fmt = options["format"] or (
+            "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+        )
+        self.batch_size = options["batch_size"]
+        self.create_categories = options["create_categories"]
+        self.checkpoint = options["checkpoint"] or os.path.abspath(path)
+
+        done = 0 if options["restart"] else self.read_checkpoint()
+        if done:
+            self.stdout.write(f"Resuming after row {done}")
+
+        self.categories = dict(Category.objects.values_list("slug", "id"))
+        self.imported = self.skipped = 0
+        started = time.monotonic()
+
+        rows = islice(read_rows(path, fmt), done, None)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            batch_started = time.monotonic()
+            # Checkpoint коммитится вместе с пачкой: падение между ними не
+            # импортирует пачку повторно (строки без slug задвоились бы)
+            with transaction.atomic():
+                count, slugs = self.import_batch(batch, first_row=done + 1)
+                done += len(batch)
+                self.write_checkpoint(done)
+            # Кэши сбрасываются после каждой закоммиченной пачки: упавший
+            # посередине импорт не оставит витрину со старыми данными
+            self.invalidate(slugs)
+            elapsed = time.monotonic() - batch_started
+            self.stdout.write(
+                f"rows {done - len(batch) + 1}-{done}: {count} imported "
+                f"({len(batch) / elapsed:.0f} rows/s)"
+            )
+
+        ImportCheckpoint.objects.filter(name=self.checkpoint).delete()
+
+        elapsed = time.monotonic() - started
+        rate = self.imported / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {self.imported} products, skipped {self.skipped} rows "
+                f"in {elapsed:.1f}s ({rate:.0f} products/s)"
+            )
+        )
+
+    def read_checkpoint(self):
+        checkpoint = ImportCheckpoint.objects.filter(name=self.checkpoint).first()
+        return checkpoint.rows_done if checkpoint else 0
+
+    def write_checkpoint(self, done):
+        ImportCheckpoint.objects.update_or_create(
+            name=self.checkpoint, defaults={"rows_done": done}
+        )
+
+    def invalidate(self, slugs):
+        if slugs:
+            invalidate_catalog()
+            bump_versions(*(f"product:{slug}" for slug in slugs))
+
+    def category_id(self, slug):
+        if not slug:
+            raise ValidationError("category is required")
+        if slug not in self.categories and self.create_categories:
+            try:
+                clean_field(Category, "slug", slug)
+            except ValidationError:
+                raise ValidationError(f"invalid category {slug!r}")
+            category, _ = Category.objects.get_or_create(
+                slug=slug, defaults={"name": slug.replace("-", " ").title()}
+            )
+            self.categories[slug] = category.id
+        if slug not in self.categories:
+            raise ValidationError(f"unknown category {slug!r}")
+        return self.categories[slug]
+
+    def parse_row(self, row, line):
+        try:
+            return self.build_product(row)
+        except ValidationError as exc:
+            self.stderr.write(f"row {line}: {' '.join(exc.messages)}")
+            return None
+
+    def build_product(self, row):
+        name = clean_field(Product, "name", (row.get("name") or "").strip())
+        try:
+            price = Decimal(str(row.get("price", "")).strip())
+        except InvalidOperation:
+            raise ValidationError(f"invalid price {row.get('price')!r}")
+        if not price.is_finite() or price < 0:
+            raise ValidationError(f"invalid price {row.get('price')!r}")
+        price = clean_field(Product, "price", price)
+        slug = (row.get("slug") or "").strip() or None
+        if slug:
+            slug = clean_field(Product, "slug", slug)
+        image = (row.get("image") or "").strip() or None
+        if image:
+            image = clean_field(Product, "image", image)
+
+        return Product(
+            name=name,
+            slug=slug,
+            description=row.get("description") or "",
+            price=price,
+            category_id=self.category_id((row.get("category") or "").strip()),
+            image=image,
+        )
+
+    def allocate_slugs(self, products):
+        """
+        Уникальные slug для новых товаров одним запросом на пачку:
+        ring, ring-2, ring-3...
+        """
+        max_length = Product._meta.get_field("slug").max_length
+        new = [
+            (
+                product,
+                slugify(product.name)[: max_length - SLUG_SUFFIX_RESERVE].strip("-")
+                or "product",
+            )
+            for product in products
+            if not product.slug
+        ]
+        if not new:
+            return
+        prefixes = {base for _, base in new}
+        taken = set(
+            Product.objects.filter(
+                reduce(
+                    or_,
+                    (
+                        Q(slug=base) | Q(slug__startswith=f"{base}-")
+                        for base in prefixes
+                    ),
+                )
+            ).values_list("slug", flat=True)
+        )
+        taken.update(product.slug for product in products if product.slug)
+
+        next_suffix = {}
+        for product, base in new:
+            slug, suffix = base, next_suffix.get(base, 2)
+            while slug in taken:
+                slug, suffix = f"{base}-{suffix}", suffix + 1
+            next_suffix[base] = suffix
+            taken.add(slug)
+            product.slug = slug
+
+    def import_batch(self, batch, first_row):
+        products = {}
+        for line, row in enumerate(batch, start=first_row):
+            product = self.parse_row(row, line)
+            if product is None:
+                self.skipped += 1
+                continue
+            # Повтор slug в одной пачке: последняя строка побеждает
+            products[product.slug or object()] = product
+        products = list(products.values())
+        if not products:
+            return 0, []
+
+        self.allocate_slugs(products)
+        # Строки без картинки не должны затирать уже загруженную
+        with_image = [product for product in products if product.image]
+        without_image = [product for product in products if not product.image]
+        for group, fields in (
+            (with_image, UPDATE_FIELDS + ["image"]),
+            (without_image, UPDATE_FIELDS),
+        ):
+            if group:
+                Product.objects.bulk_create(
+                    group,
+                    update_conflicts=True,
+                    unique_fields=["slug"],
+                    update_fields=fields,
+                )
+        slugs = [product.slug for product in products]
+        ids = Product.objects.filter(slug__in=slugs).values_list("id", flat=True)
+        index_products(list(ids))
+
+        self.imported += len(products)
+        return len(products), slugs
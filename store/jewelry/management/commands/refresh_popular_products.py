@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from jewelry.popular import POPULAR_POOL_SIZE, refresh_popular_pool
+
+
+class Command(BaseCommand):
+    help = "Rebuild the cached pool of popular products shown on the home page"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=POPULAR_POOL_SIZE)
+
+    def handle(self, *args, **options):
+        pool = refresh_popular_pool(options["size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Popular products pool refreshed: {len(pool)} items")
+        )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from jewelry.reports import ROLLUP_BATCH_SIZE, reset_sales_rollups, roll_up_sales
+
+
+class Command(BaseCommand):
+    help = "Add orders placed since the last run to the daily sales rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=ROLLUP_BATCH_SIZE)
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Drop the rollups and rebuild them from all orders",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            reset_sales_rollups()
+
+        total = 0
+        while True:
+            processed = roll_up_sales(options["batch_size"])
+            if not processed:
+                break
+            total += processed
+            self.stdout.write(f"{total} orders rolled up")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} new orders"))
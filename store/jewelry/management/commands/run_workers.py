@@ -0,0 +1,89 @@
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from jewelry.jobs import (
+    JOB_BATCH_SIZE,
+    JOB_RELEASE_INTERVAL,
+    release_stale_jobs,
+    run_pending,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background job workers (emails and other queued jobs). Each worker "
+        "thread claims a batch of due jobs, runs it and sleeps when idle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--batch-size", type=int, default=JOB_BATCH_SIZE)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when the queue is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run until no job is due, then exit (for cron and tests)",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        self.release_stale()
+
+        self.processed = 0
+        self.lock = threading.Lock()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        threads = [
+            threading.Thread(
+                target=self.work, args=(f"{prefix}:{i}", options), daemon=True
+            )
+            for i in range(options["workers"])
+        ]
+        for thread in threads:
+            thread.start()
+        # Зависшие задачи ищет главный поток, пока воркеры работают
+        next_release = time.monotonic() + JOB_RELEASE_INTERVAL
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+                if time.monotonic() >= next_release:
+                    self.release_stale()
+                    next_release = time.monotonic() + JOB_RELEASE_INTERVAL
+        self.stdout.write(self.style.SUCCESS(f"Processed {self.processed} jobs"))
+
+    def release_stale(self):
+        released = release_stale_jobs()
+        if released:
+            self.stdout.write(f"Released {released} stale jobs")
+
+    def stop(self, signum, frame):
+        self.stdout.write("Stopping after the current batch...")
+        self.stopping.set()
+
+    def work(self, worker, options):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                count = run_pending(worker, options["batch_size"])
+                with self.lock:
+                    self.processed += count
+                if not count:
+                    if options["once"]:
+                        break
+                    self.stopping.wait(options["poll_interval"])
+        finally:
+            connections.close_all()
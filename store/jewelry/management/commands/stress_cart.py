@@ -0,0 +1,122 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections
+from django.test import Client
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from jewelry.benchmark import local_caches
+from jewelry.cart import add_cart_items
+from jewelry.models import CartItem, Category, CustomUser, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer one user's cart from many threads in a throwaway test database "
+        "and check that no increment is lost and no duplicate rows appear."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--adds", type=int, default=50, help="Adds per thread")
+        parser.add_argument("--products", type=int, default=3)
+        parser.add_argument(
+            "--client",
+            action="store_true",
+            help="Go through the add_to_cart view instead of calling the cart API",
+        )
+
+    def handle(self, *args, **options):
+        local = local_caches()
+        local.enable()
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            result = self.stress(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            local.disable()
+
+        expected, quantities, rows, errors, elapsed = result
+        total = options["threads"] * options["adds"]
+        self.stdout.write(
+            f"{total} adds from {options['threads']} threads in {elapsed:.2f}s "
+            f"({total / elapsed:.0f}/s), {len(errors)} errors"
+        )
+        for error in errors[:5]:
+            self.stderr.write(error)
+        if quantities != expected or rows != len(expected) or errors:
+            raise CommandError(
+                f"Lost updates: expected {expected}, got {quantities} "
+                f"in {rows} rows"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Exact counts: {quantities}"))
+
+    def stress(self, options):
+        category = Category.objects.create(name="Stress", slug="stress")
+        products = Product.objects.bulk_create(
+            Product(
+                name=f"Stress {i}",
+                slug=f"stress-{i}",
+                description="",
+                price=1,
+                category=category,
+            )
+            for i in range(options["products"])
+        )
+        user = CustomUser.objects.create_user(
+            username="stress",
+            email="stress@example.com",
+            phone="5550000000",
+            password="stress-password",
+        )
+
+        errors = []
+        barrier = threading.Barrier(options["threads"])
+
+        def worker(index):
+            client = None
+            if options["client"]:
+                client = Client()
+                client.force_login(user)
+            barrier.wait()
+            try:
+                for n in range(options["adds"]):
+                    product = products[(index + n) % len(products)]
+                    try:
+                        if client is None:
+                            add_cart_items(user, {product.id: 1})
+                        else:
+                            client.get(reverse("add_to_cart", args=[product.id]))
+                    except DatabaseError as exc:
+                        errors.append(f"thread {index}: {exc}")
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=worker, args=(i,))
+            for i in range(options["threads"])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        expected = {}
+        for index in range(options["threads"]):
+            for n in range(options["adds"]):
+                product_id = products[(index + n) % len(products)].id
+                expected[product_id] = expected.get(product_id, 0) + 1
+        lines = CartItem.objects.filter(user=user)
+        quantities = dict(lines.values_list("product_id", "quantity"))
+        return expected, quantities, lines.count(), errors, elapsed
@@ -0,0 +1,166 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections
+from django.db.models import Sum
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from jewelry.benchmark import local_caches, percentile
+from jewelry.forms import OrderForm
+from jewelry.inventory import OutOfStock, StockBusy
+from jewelry.models import CartItem, Category, CustomUser, OrderItem, Product
+from jewelry.orders import place_order
+
+ORDER_DATA = {
+    "full_name": "Stress Buyer",
+    "email": "buyer@example.com",
+    "phone": "5550000000",
+    "country": "Country",
+    "region": "Region",
+    "city": "City",
+    "postal_code": "12345",
+    "address": "1 Main Street",
+}
+
+
+def use_sqlite_file():
+    """
+    Общая in-memory база SQLite сразу отвечает «table is locked» на
+    параллельную запись. Для стенда на SQLite берём файл и IMMEDIATE-
+    транзакции: писатели ждут друг друга по busy timeout, как строки в
+    Postgres ждут блокировку.
+    """
+    for connection in connections.all():
+        if connection.vendor == "sqlite":
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                tempfile.gettempdir(), f"jewelry_stress_{connection.alias}.sqlite3"
+            )
+            connection.settings_dict["OPTIONS"]["transaction_mode"] = "IMMEDIATE"
+
+
+class Command(BaseCommand):
+    help = (
+        "Run many concurrent checkouts of one limited item in a throwaway test "
+        "database and check that stock is never oversold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=200)
+        parser.add_argument("--stock", type=int, default=25)
+        parser.add_argument("--quantity", type=int, default=1, help="Per buyer")
+
+    def handle(self, *args, **options):
+        local = local_caches()
+        local.enable()
+        setup_test_environment()
+        use_sqlite_file()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            outcome, timings, stock_left, sold, elapsed = self.stress(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            local.disable()
+
+        timings.sort()
+        self.stdout.write(
+            f"{options['buyers']} checkouts in {elapsed:.2f}s: "
+            + ", ".join(f"{name} {count}" for name, count in outcome.items())
+        )
+        self.stdout.write(
+            f"latency p50 {percentile(timings, 50):.1f} ms, "
+            f"p99 {percentile(timings, 99):.1f} ms, max {timings[-1]:.1f} ms"
+        )
+        self.stdout.write(f"stock left {stock_left}, units sold {sold}")
+
+        expected_orders = min(
+            options["buyers"], options["stock"] // options["quantity"]
+        )
+        if (
+            stock_left is None
+            or stock_left < 0
+            or sold + stock_left != options["stock"]
+            or outcome["placed"] * options["quantity"] != sold
+            or outcome["error"]
+        ):
+            raise CommandError("Stock and orders disagree: oversold or lost units")
+        if outcome["placed"] + outcome["busy"] < expected_orders:
+            raise CommandError(
+                f"Only {outcome['placed']} of {expected_orders} possible orders placed"
+            )
+        self.stdout.write(self.style.SUCCESS("No oversells"))
+
+    def stress(self, options):
+        category = Category.objects.create(name="Stress", slug="stress")
+        product = Product.objects.create(
+            name="One of a kind",
+            slug="one-of-a-kind",
+            description="",
+            price=100,
+            stock=options["stock"],
+            category=category,
+        )
+        password = make_password("stress-password")
+        users = CustomUser.objects.bulk_create(
+            CustomUser(
+                username=f"buyer{i}",
+                email=f"buyer{i}@example.com",
+                phone=f"{5550000000 + i}",
+                password=password,
+            )
+            for i in range(options["buyers"])
+        )
+        CartItem.objects.bulk_create(
+            CartItem(user=user, product=product, quantity=options["quantity"])
+            for user in users
+        )
+
+        outcome = {"placed": 0, "sold_out": 0, "busy": 0, "error": 0}
+        timings = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(users))
+
+        def buyer(user):
+            barrier.wait()
+            started = time.perf_counter()
+            form = OrderForm(ORDER_DATA)
+            form.is_valid()
+            try:
+                place_order(form, user)
+                result = "placed"
+            except OutOfStock:
+                result = "sold_out"
+            except StockBusy:
+                result = "busy"
+            except DatabaseError as exc:
+                self.stderr.write(f"{user.username}: {exc}")
+                result = "error"
+            finally:
+                connections.close_all()
+            with lock:
+                outcome[result] += 1
+                timings.append((time.perf_counter() - started) * 1000)
+
+        threads = [threading.Thread(target=buyer, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        sold = (
+            OrderItem.objects.filter(product=product).aggregate(n=Sum("quantity"))["n"]
+            or 0
+        )
+        return outcome, timings, product.stock, sold, elapsed
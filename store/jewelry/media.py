@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+MEDIA_URL_CACHE_SIZE = getattr(settings, "MEDIA_URL_CACHE_SIZE", 4096)
+# «Файла нет» помним недолго: производные картинки появляются позже
+# (generate_image_derivatives в другом процессе) и должны подхватываться
+# без перезапуска воркеров
+MEDIA_MISSING_TTL = getattr(settings, "MEDIA_MISSING_TTL", 30)
+
+_MISSING = object()
+
+
+class MediaURLCache:
+    """
+    Процессный LRU-кэш «путь файла -> URL (или None, если файла нет)».
+    Избавляет от os.path.exists на каждую карточку товара при каждом рендере.
+    Отсутствие файла хранится только missing_ttl секунд.
+    """
+
+    def __init__(self, maxsize=MEDIA_URL_CACHE_SIZE, missing_ttl=MEDIA_MISSING_TTL):
+        self.maxsize = maxsize
+        self.missing_ttl = missing_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            url, expires = self._data.get(name, (_MISSING, None))
+            if expires is not None and expires <= time.monotonic():
+                del self._data[name]
+                return _MISSING
+            if url is not _MISSING:
+                self._data.move_to_end(name)
+            return url
+
+    def set(self, name, url):
+        expires = None if url is not None else time.monotonic() + self.missing_ttl
+        with self._lock:
+            self._data[name] = (url, expires)
+            self._data.move_to_end(name)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, name):
+        with self._lock:
+            self._data.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+media_url_cache = MediaURLCache()
+
+
+def resolve_media_name(name):
+    """
+    URL файла по его пути в MEDIA_ROOT или None, если файла нет.
+    При MEDIA_TRUST_DATABASE=True файл считается существующим без проверки
+    (в том числе уменьшенные копии — их создаёт задача после сохранения).
+    """
+    if getattr(settings, "MEDIA_TRUST_DATABASE", False):
+        return default_storage.url(name)
+    url = media_url_cache.get(name)
+    if url is not _MISSING:
+        return url
+
+    url = None
+    if os.path.exists(os.path.join(settings.MEDIA_ROOT, name)):
+        url = default_storage.url(name)
+    media_url_cache.set(name, url)
+    return url
+
+
+def resolve_media_url(field):
+    """
+    URL файла из ImageField или None, если файла нет/битый путь.
+    При MEDIA_TRUST_DATABASE=True файловая система не проверяется вовсе.
+    """
+    if not field:
+        return None
+    if getattr(settings, "MEDIA_TRUST_DATABASE", False):
+        return field.url
+    return resolve_media_name(str(field))
@@ -0,0 +1,325 @@
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.crypto import constant_time_compare
+
+# Верхние границы корзин гистограммы времени ответа, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_INTERVAL = 10
+UNRESOLVED_VIEW = "<unresolved>"
+
+# Время рендера шаблонов текущего запроса; None — запрос не в выборке
+_template_time = contextvars.ContextVar("jewelry_template_time", default=None)
+
+
+class MetricsRegistry:
+    """
+    Счётчики и гистограммы процесса. Всё под одной блокировкой: запись —
+    несколько сложений, так что конкуренции почти нет.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, view, seconds):
+        with self.lock:
+            histogram = self.histograms.get(view)
+            if histogram is None:
+                histogram = self.histograms[view] = [
+                    [0] * (len(LATENCY_BUCKETS) + 1),
+                    0.0,
+                ]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+                    break
+            else:
+                histogram[0][-1] += 1
+            histogram[1] += seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": [
+                    [name, list(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                "histograms": {
+                    view: [list(buckets), total]
+                    for view, (buckets, total) in self.histograms.items()
+                },
+            }
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+registry = MetricsRegistry()
+
+
+def _merge(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for view, (buckets, total) in snapshot["histograms"].items():
+            merged = histograms.setdefault(view, [[0] * len(buckets), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+    return counters, histograms
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class _Flusher:
+    """
+    При METRICS_DIR каждый процесс раз в FLUSH_INTERVAL секунд пишет свой
+    снимок в <dir>/<pid>.json; /metrics складывает файлы всех воркеров.
+    """
+
+    def __init__(self):
+        self.last = 0.0
+        self.lock = threading.Lock()
+
+    def maybe_flush(self, now):
+        directory = getattr(settings, "METRICS_DIR", None)
+        if not directory or now - self.last < FLUSH_INTERVAL:
+            return
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.last = now
+            write_snapshot(directory)
+        finally:
+            self.lock.release()
+
+
+_flusher = _Flusher()
+
+
+def write_snapshot(directory):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(tmp, path)
+
+
+def collect():
+    """
+    Снимок своего процесса плюс файлы остальных живых воркеров. Файлы
+    завершившихся процессов удаляются.
+    """
+    snapshots = [registry.snapshot()]
+    directory = getattr(settings, "METRICS_DIR", None)
+    if directory and os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            stem, ext = os.path.splitext(filename)
+            if ext != ".json" or not stem.isdigit():
+                continue
+            pid = int(stem)
+            path = os.path.join(directory, filename)
+            if pid == os.getpid():
+                continue
+            if not _pid_alive(pid):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return _merge(snapshots)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+COUNTER_HELP = {
+    "jewelry_http_requests_total": "Requests by view, method and status.",
+    "jewelry_http_response_bytes_total": "Response body bytes by view.",
+    "jewelry_sampled_requests_total": "Requests with DB and template timings.",
+    "jewelry_db_queries_total": "DB queries in sampled requests.",
+    "jewelry_db_query_seconds_total": "DB query time in sampled requests.",
+    "jewelry_template_render_seconds_total": "Template time in sampled requests.",
+    "jewelry_throttled_requests_total": "Login/registration attempts over the limit.",
+    "jewelry_throttle_fallback_total": "Throttle checks done in memory (cache down).",
+}
+
+
+def render_prometheus(counters, histograms):
+    lines = []
+    by_name = {}
+    for (name, labels), value in sorted(counters.items()):
+        by_name.setdefault(name, []).append((labels, value))
+    for name, samples in by_name.items():
+        lines.append(f"# HELP {name} {COUNTER_HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    name = "jewelry_http_request_duration_seconds"
+    lines.append(f"# HELP {name} Request latency by view.")
+    lines.append(f"# TYPE {name} histogram")
+    for view, (buckets, total) in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+            cumulative += count
+            labels = _format_labels((("view", view), ("le", str(bound))))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels((("view", view),))
+        lines.append(f"{name}_sum{labels} {total}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class _QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """
+    Время ответа, статус и размер — для каждого запроса. Число и время
+    SQL-запросов и время шаблонов — только для доли METRICS_SAMPLE_RATE,
+    чтобы обёртка execute_wrapper не стоила ничего остальным запросам.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            return self.get_response(request)
+
+        sampled = random.random() < getattr(settings, "METRICS_SAMPLE_RATE", 0.05)
+        started = time.perf_counter()
+        if sampled:
+            timer = _QueryTimer()
+            token = _template_time.set([0.0])
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+            template_seconds = _template_time.get()[0]
+            _template_time.reset(token)
+        else:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else UNRESOLVED_VIEW
+        registry.inc(
+            "jewelry_http_requests_total",
+            {"view": view, "method": request.method, "status": response.status_code},
+        )
+        registry.observe(view, elapsed)
+        if response.streaming:
+            size = response.get("Content-Length")
+        else:
+            size = len(response.content)
+        if size:
+            registry.inc("jewelry_http_response_bytes_total", {"view": view}, int(size))
+        if sampled:
+            labels = {"view": view}
+            registry.inc("jewelry_sampled_requests_total", labels)
+            registry.inc("jewelry_db_queries_total", labels, timer.count)
+            registry.inc("jewelry_db_query_seconds_total", labels, timer.seconds)
+            registry.inc(
+                "jewelry_template_render_seconds_total", labels, template_seconds
+            )
+
+        _flusher.maybe_flush(time.monotonic())
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        accumulator = _template_time.get()
+        if accumulator is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            accumulator[0] += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    DjangoTemplates, который меряет время рендера для MetricsMiddleware.
+    Считаются только шаблоны верхнего уровня ({% include %} входит в них).
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def metrics_view(request):
+    """
+    Prometheus text format. Доступ — сотрудникам или по
+    Authorization: Bearer <METRICS_TOKEN>.
+    """
+    token = getattr(settings, "METRICS_TOKEN", None)
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if not authorized and token:
+        authorized = constant_time_compare(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        )
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_prometheus(*collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -1,4 +1,6 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 from django.utils.text import slugify
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
@@ -47,6 +49,15 @@ class Product(models.Model):
         related_name="products",
         verbose_name="Category",
     )
+    # NULL — остаток не учитывается (изделия под заказ)
+    stock = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Stock",
+        help_text="Leave empty for items that are not stock-limited.",
+    )
+    # Заполняется jewelry.search.index_products, индекс создаётся после migrate
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -59,6 +70,13 @@ class Product(models.Model):
     class Meta:
         verbose_name = "Product"
         verbose_name_plural = "Products"
+        indexes = [
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(fields=["name", "id"], name="product_name_id_idx"),
+            models.Index(
+                fields=["category", "price", "id"], name="product_cat_price_id_idx"
+            ),
+        ]
 
 
 class CartItem(models.Model):
@@ -72,14 +90,31 @@ class CartItem(models.Model):
     added_at = models.DateTimeField(auto_now_add=True)
 
     def total_price(self):
+        # line_total считается в SQL (jewelry.cart.get_cart_lines)
+        if hasattr(self, "line_total"):
+            return self.line_total
         return self.quantity * self.product.price
 
     class Meta:
         verbose_name = "Cart Item"
         verbose_name_plural = "Cart Items"
+        constraints = [
+            # Цель ON CONFLICT в jewelry.cart.add_cart_items
+            models.UniqueConstraint(
+                fields=["user", "product"], name="cartitem_user_product_uniq"
+            ),
+        ]
 
 
 class Order(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="orders",
+        verbose_name="Customer",
+    )
     full_name = models.CharField(max_length=255, verbose_name="Full Name")
     email = models.EmailField(verbose_name="Customer Email")
     phone = models.CharField(max_length=15, verbose_name="Phone")
@@ -90,6 +125,10 @@ class Order(models.Model):
     postal_code = models.CharField(max_length=20, verbose_name="Postal Code")
 
     address = models.TextField(verbose_name="Shipping Address")
+    total = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, verbose_name="Order Total"
+    )
+    item_count = models.PositiveIntegerField(default=0, verbose_name="Items")
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -98,6 +137,13 @@ class Order(models.Model):
     class Meta:
         verbose_name = "Order"
         verbose_name_plural = "Orders"
+        indexes = [
+            models.Index(fields=["created_at"], name="order_created_at_idx"),
+            # История заказов покупателя: одна выборка по диапазону индекса
+            models.Index(
+                fields=["user", "-created_at", "-id"], name="order_user_created_idx"
+            ),
+        ]
 
 
 class OrderItem(models.Model):
@@ -106,10 +152,116 @@ class OrderItem(models.Model):
     )
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # NULL только у позиций, оформленных до фиксации цен; их заполняет
+    # manage.py backfill_order_prices
+    unit_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, verbose_name="Unit Price"
+    )
 
     def total_price(self):
-        return self.quantity * self.product.price
+        if self.unit_price is None:
+            return self.quantity * self.product.price
+        return self.quantity * self.unit_price
 
     class Meta:
         verbose_name = "Order Item"
         verbose_name_plural = "Order Items"
+
+
+class DailyProductSales(models.Model):
+    date = models.DateField(verbose_name="Date")
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, verbose_name="Product"
+    )
+    quantity = models.PositiveIntegerField(default=0, verbose_name="Units Sold")
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Revenue"
+    )
+
+    class Meta:
+        verbose_name = "Daily Product Sales"
+        verbose_name_plural = "Daily Product Sales"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "product"], name="daily_product_sales_unique"
+            ),
+        ]
+
+
+class DailyCategorySales(models.Model):
+    date = models.DateField(verbose_name="Date")
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, verbose_name="Category"
+    )
+    quantity = models.PositiveIntegerField(default=0, verbose_name="Units Sold")
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Revenue"
+    )
+
+    class Meta:
+        verbose_name = "Daily Category Sales"
+        verbose_name_plural = "Daily Category Sales"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "category"], name="daily_category_sales_unique"
+            ),
+        ]
+
+
+class RollupWatermark(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    last_order_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: order {self.last_order_id}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Сколько строк файла уже импортировано; пишется в транзакции пачки.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    rows_done = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.rows_done} rows"
+
+
+class Job(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    kind = models.CharField(max_length=50, verbose_name="Kind")
+    payload = models.JSONField(default=dict, verbose_name="Payload")
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name="Status"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Attempts")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="Max Attempts")
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Run At")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="Worker")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, verbose_name="Last Error")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
+
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="job_status_run_at_idx"),
+        ]
@@ -0,0 +1,144 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.template.loader import render_to_string
+
+from .cart import cart_items_for, get_cart_lines
+from .inventory import reserve_stock
+from .jobs import send_mail_later
+from .models import CustomUser, Order, OrderItem, Product
+from .reports import ITEM_REVENUE
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+@transaction.atomic
+def place_order(form, user):
+    """
+    Оформляет заказ из корзины пользователя в одной транзакции: блокирует
+    строки корзины, списывает остатки (reserve_stock), фиксирует цены на
+    момент покупки, сумму и число единиц в заказе (для истории заказов без
+    агрегатов), пишет все OrderItem одним bulk_create и очищает корзину.
+    Письмо-подтверждение ставится в очередь в той же транзакции. Возвращает
+    None, если корзина пуста; при нехватке товара бросает OutOfStock и
+    ничего не меняет.
+    """
+    lines = list(get_cart_lines(user).select_for_update(of=("self",)))
+    if not lines:
+        return None
+
+    quantities = {}
+    for line in lines:
+        quantities[line.product_id] = quantities.get(line.product_id, 0) + line.quantity
+    reserve_stock(quantities)
+
+    order = form.save(commit=False)
+    order.user = user
+    order.item_count = sum(quantities.values())
+    order.total = sum((line.line_total for line in lines), Decimal("0.00"))
+    order.save()
+
+    OrderItem.objects.bulk_create(
+        [
+            OrderItem(
+                order=order,
+                product_id=line.product_id,
+                quantity=line.quantity,
+                unit_price=line.product.price,
+            )
+            for line in lines
+        ]
+    )
+    cart_items_for(user).filter(id__in=[line.id for line in lines]).delete()
+    send_order_confirmation(order, lines)
+    return order
+
+
+def send_order_confirmation(order, lines):
+    send_mail_later(
+        subject=f"Imperial Gems: order #{order.id} confirmed",
+        body=render_to_string(
+            "jewelry/emails/order_confirmation.txt", {"order": order, "lines": lines}
+        ),
+        to=[order.email],
+    )
+
+
+def order_total_subquery():
+    """
+    Сумма позиций заказа (OuterRef("pk")) для UPDATE заказов пачкой.
+    """
+    return Coalesce(
+        Subquery(
+            OrderItem.objects.filter(order=OuterRef("pk"))
+            .order_by()
+            .values("order")
+            .annotate(total=Sum(ITEM_REVENUE))
+            .values("total")
+        ),
+        Decimal("0.00"),
+    )
+
+
+def backfill_order_prices(after_id=0, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Для заказов, оформленных до фиксации цен: unit_price позиций берётся из
+    текущей цены товара, total заказа пересчитывается по позициям. Трогает
+    только заказы с незаполненными ценами. Возвращает последний id пачки
+    или None.
+    """
+    ids = list(
+        Order.objects.filter(id__gt=after_id)
+        .order_by("id")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if not ids:
+        return None
+    with transaction.atomic():
+        items = OrderItem.objects.filter(order_id__in=ids, unit_price__isnull=True)
+        legacy = set(items.values_list("order_id", flat=True))
+        items.update(
+            unit_price=Subquery(
+                Product.objects.filter(pk=OuterRef("product_id")).values("price")[:1]
+            )
+        )
+        Order.objects.filter(id__in=legacy).update(total=order_total_subquery())
+    return ids[-1]
+
+
+def backfill_order_history(after_id=0, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Для заказов, оформленных до появления истории: привязывает заказ к
+    пользователю по email, пересчитывает item_count и total по позициям.
+    Пачка — диапазон id и два UPDATE с подзапросами. Возвращает последний
+    id пачки или None.
+    """
+    ids = list(
+        Order.objects.filter(id__gt=after_id)
+        .order_by("id")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if not ids:
+        return None
+    batch = Order.objects.filter(id__in=ids)
+    batch.filter(user__isnull=True).update(
+        user=Subquery(
+            CustomUser.objects.filter(email=OuterRef("email")).values("id")[:1]
+        )
+    )
+    batch.update(
+        item_count=Coalesce(
+            Subquery(
+                OrderItem.objects.filter(order=OuterRef("pk"))
+                .order_by()
+                .values("order")
+                .annotate(n=Sum("quantity"))
+                .values("n")
+            ),
+            0,
+        ),
+        total=order_total_subquery(),
+    )
+    return ids[-1]
@@ -0,0 +1,154 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, urlencode
+
+from .cart import ANONYMOUS_CART_COOKIE
+from .routers import cache_timeout
+
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+VERSION_TIMEOUT = None
+# HTML страниц — в отдельном кэше, чтобы не вытеснять версии, корзины
+# лимитов и счётчики фасетов
+PAGE_CACHE = "pages"
+
+# Зависимости страниц:
+#   nav              — меню категорий со счётчиками (есть на каждой странице)
+#   listing          — общий каталог /products/
+#   category:<slug>  — страница категории
+#   product:<slug>   — карточка товара
+
+
+def _version_key(name):
+    return f"jewelry:version:{name}"
+
+
+def bump_versions(*names):
+    for name in names:
+        key = _version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), VERSION_TIMEOUT)
+
+
+def get_versions(names):
+    """
+    Текущие версии зависимостей одним get_many. Если версии нет в кэше,
+    она заводится заново от текущего времени, чтобы не совпасть со старой.
+    """
+    keys = {_version_key(name): name for name in names}
+    found = cache.get_many(keys)
+    versions = []
+    for key, name in keys.items():
+        if key not in found:
+            cache.add(key, time.time_ns(), VERSION_TIMEOUT)
+            found[key] = cache.get(key)
+        versions.append(f"{name}={found[key]}")
+    return versions
+
+
+def _is_anonymous(request):
+    """
+    Без обращения к сессии: нет cookie сессии — точно гость.
+    Cookie сообщений означает непоказанные сообщения, такие ответы не кэшируем.
+    """
+    return (
+        settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and "messages" not in request.COOKIES
+    )
+
+
+def _variant(request):
+    # Гостевая корзина влияет на счётчик в шапке
+    cart = request.COOKIES.get(ANONYMOUS_CART_COOKIE, "")
+    return hashlib.md5(cart.encode()).hexdigest() if cart else "anon"
+
+
+def _page_path(request, params):
+    """
+    Путь с параметрами, которые читает страница, в постоянном порядке.
+    None — в запросе есть посторонние параметры, такой ответ не кэшируем.
+    """
+    if any(name not in params for name in request.GET):
+        return None
+    query = sorted((name, request.GET.getlist(name)) for name in request.GET)
+    return f"{request.path}?{urlencode(query, doseq=True)}"
+
+
+def versioned_page(*dependencies, params=()):
+    """
+    Кэширует HTML страницы для гостей по версиям зависимостей и отвечает
+    304 на If-None-Match/If-Modified-Since, не трогая БД.
+    dependencies — строки с подстановкой kwargs из URL: "product:{slug}".
+    params — GET-параметры, от которых зависит страница; запросы с другими
+    параметрами рендерятся без кэша, чтобы ?x=<случайное> не раздувало его.
+    Для вошедших пользователей страница рендерится как обычно.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            path = _page_path(request, params)
+            if (
+                request.method not in ("GET", "HEAD")
+                or not _is_anonymous(request)
+                or path is None
+            ):
+                response = view(request, *args, **kwargs)
+                patch_vary_headers(response, ("Cookie",))
+                patch_cache_control(response, private=True, no_cache=True)
+                return response
+
+            names = [dependency.format(**kwargs) for dependency in dependencies]
+            versions = get_versions(names)
+            etag = (
+                '"%s"'
+                % hashlib.md5(
+                    "|".join([path, _variant(request), *versions]).encode()
+                ).hexdigest()
+            )
+            entry_key = f"jewelry:page:{etag}"
+
+            if etag in request.headers.get("If-None-Match", ""):
+                response = HttpResponseNotModified()
+                response["ETag"] = etag
+                patch_vary_headers(response, ("Cookie",))
+                return response
+
+            pages = caches[PAGE_CACHE]
+            entry = pages.get(entry_key)
+            if entry is not None:
+                content, content_type, last_modified = entry
+                since = parse_http_date_safe(
+                    request.headers.get("If-Modified-Since", "")
+                )
+                if since is not None and int(last_modified) <= since:
+                    response = HttpResponseNotModified()
+                else:
+                    response = HttpResponse(content, content_type=content_type)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return response
+                last_modified = time.time()
+                pages.set(
+                    entry_key,
+                    (response.content, response["Content-Type"], last_modified),
+                    cache_timeout(PAGE_CACHE_TIMEOUT),
+                )
+
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            patch_vary_headers(response, ("Cookie",))
+            patch_cache_control(response, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
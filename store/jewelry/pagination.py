@@ -0,0 +1,265 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+PRODUCTS_PER_PAGE = 24
+
+# Порядок сортировки каталога -> (поле, направление). Последний ключ всегда id,
+# чтобы порядок был стабильным при одинаковых ценах/названиях.
+PRODUCT_ORDERINGS = {
+    "price": ("price", "id"),
+    "-price": ("-price", "-id"),
+    "name": ("name", "id"),
+    "-name": ("-name", "-id"),
+}
+DEFAULT_PRODUCT_ORDERING = "price"
+# Поля карточки товара в списках: description и search_vector не грузим
+PRODUCT_CARD_FIELDS = ("id", "name", "slug", "price", "image", "category_id")
+
+ORDERS_PER_PAGE = 10
+# Совпадает с индексом order_user_created_idx
+ORDER_HISTORY_ORDERING = ("-created_at", "-id")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.object_list = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, [str(value) for value in values]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, fields):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if direction not in ("next", "prev") or len(values) != len(fields):
+        raise InvalidCursor(cursor)
+    return direction, [_coerce(field, value) for field, value in zip(fields, values)]
+
+
+def _coerce(field, value):
+    name = field.lstrip("-")
+    try:
+        if name == "id":
+            return int(value)
+        if name == "price":
+            return Decimal(value)
+        if name == "created_at":
+            return datetime.fromisoformat(value)
+    except (ValueError, InvalidOperation):
+        raise InvalidCursor(value)
+    return value
+
+
+def _field_value(obj, field):
+    name = field.lstrip("-")
+    if isinstance(obj, dict):
+        return obj[name]
+    return getattr(obj, name)
+
+
+def _after(fields, values):
+    """
+    Условие «строго после (values)» для составного ключа в порядке fields:
+    a >= x AND ((a > x) OR (a = x AND b > y) ...). Ведущее a >= x ничего
+    не меняет в результате, но даёт планировщику границу диапазона по
+    индексу (a, b): без него OR читается сканом с фильтром.
+    """
+    first = fields[0].lstrip("-")
+    bound = Q(
+        **{f"{first}__{'lte' if fields[0].startswith('-') else 'gte'}": values[0]}
+    )
+    condition = Q()
+    for i, field in enumerate(fields):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        step = Q(**{f"{name}__{lookup}": values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            step &= Q(**{prev_field.lstrip("-"): prev_value})
+        condition |= step
+    return bound & condition
+
+
+def _reverse(fields):
+    return tuple(f[1:] if f.startswith("-") else f"-{f}" for f in fields)
+
+
+def keyset_paginate(queryset, fields, cursor=None, per_page=PRODUCTS_PER_PAGE):
+    """
+    Курсорная пагинация по составному индексированному ключу. Каждая страница —
+    это WHERE по ключу + LIMIT, поэтому страница N стоит столько же, сколько
+    первая (в отличие от OFFSET).
+    """
+    direction, values = "next", None
+    if cursor:
+        direction, values = decode_cursor(cursor, fields)
+
+    ordering = fields if direction == "next" else _reverse(fields)
+    qs = queryset.order_by(*ordering)
+    if values is not None:
+        qs = qs.filter(_after(ordering, values))
+
+    items = list(qs[: per_page + 1])
+    has_more = len(items) > per_page
+    items = items[:per_page]
+
+    if direction == "prev":
+        items.reverse()
+
+    next_cursor = previous_cursor = None
+    if items:
+        first = [_field_value(items[0], f) for f in fields]
+        last = [_field_value(items[-1], f) for f in fields]
+        if direction == "next":
+            if has_more:
+                next_cursor = encode_cursor("next", last)
+            if values is not None:
+                previous_cursor = encode_cursor("prev", first)
+        else:
+            next_cursor = encode_cursor("next", last)
+            if has_more:
+                previous_cursor = encode_cursor("prev", first)
+
+    return KeysetPage(items, next_cursor, previous_cursor)
+
+
+def keyset_iterate(
+    queryset, fields, cursor=None, per_page=PRODUCTS_PER_PAGE, chunk_size=2000
+):
+    """
+    keyset_paginate для больших страниц (API): строки не собираются в список,
+    а читаются через .iterator() и отдаются по мере чтения. Возвращает
+    (rows, page): rows — генератор, курсоры page заполняются, когда он
+    исчерпан. Страница назад сначала ищет свою первую строку запросом только
+    по ключам, чтобы дальше читать в прямом порядке.
+    """
+    direction, values = "next", None
+    if cursor:
+        direction, values = decode_cursor(cursor, fields)
+    page = KeysetPage([])
+    keys = [field.lstrip("-") for field in fields]
+    qs = queryset.order_by(*fields)
+
+    if direction == "next":
+        if values is not None:
+            qs = qs.filter(_after(fields, values))
+        limit = per_page + 1
+    else:
+        backwards = _reverse(fields)
+        before = queryset.order_by(*backwards).filter(_after(backwards, values))
+        behind = list(before.values_list(*keys)[: per_page + 1])
+        if not behind:
+            return iter(()), page
+        start = behind[:per_page][-1]
+        qs = qs.filter(
+            _after(backwards, values)
+            & (_after(fields, start) | Q(**dict(zip(keys, start))))
+        )
+        limit = per_page
+
+    def rows():
+        first = last = None
+        count = 0
+        for row in qs[:limit].iterator(chunk_size=chunk_size):
+            count += 1
+            if count > per_page:
+                break
+            if first is None:
+                first = row
+            last = row
+            yield row
+        if last is None:
+            return
+        first_values = [_field_value(first, f) for f in fields]
+        last_values = [_field_value(last, f) for f in fields]
+        if direction == "next":
+            if count > per_page:
+                page.next_cursor = encode_cursor("next", last_values)
+            if values is not None:
+                page.previous_cursor = encode_cursor("prev", first_values)
+        else:
+            page.next_cursor = encode_cursor("next", last_values)
+            if len(behind) > per_page:
+                page.previous_cursor = encode_cursor("prev", first_values)
+
+    return rows(), page
+
+
+def paginate_products(request, queryset, per_page=PRODUCTS_PER_PAGE):
+    queryset = queryset.only(*PRODUCT_CARD_FIELDS)
+    sort = request.GET.get("sort", DEFAULT_PRODUCT_ORDERING)
+    if sort not in PRODUCT_ORDERINGS:
+        sort = DEFAULT_PRODUCT_ORDERING
+    try:
+        page = keyset_paginate(
+            queryset, PRODUCT_ORDERINGS[sort], request.GET.get("cursor"), per_page
+        )
+    except InvalidCursor:
+        page = keyset_paginate(queryset, PRODUCT_ORDERINGS[sort], None, per_page)
+    return page, sort
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Для больших таблиц на Postgres берёт оценку числа строк из статистики
+    (pg_class.reltuples) вместо COUNT(*). Только для запросов без фильтров;
+    маленькие таблицы и отфильтрованные списки считаются точно.
+    """
+
+    estimate_threshold = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if (
+            isinstance(queryset, QuerySet)
+            and not queryset.query.where
+            and connections[queryset.db].vendor == "postgresql"
+        ):
+            with connections[queryset.db].cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_threshold:
+                return row[0]
+        return super().count
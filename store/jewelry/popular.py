@@ -0,0 +1,96 @@
+import random
+import time
+
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .jobs import enqueue, job_handler
+from .models import OrderItem, Product
+from .pagination import PRODUCT_CARD_FIELDS
+
+POPULAR_POOL_CACHE_KEY = "jewelry:popular_products"
+POPULAR_POOL_LOCK_KEY = "jewelry:popular_products:lock"
+POPULAR_POOL_SIZE = 32
+# Через столько пул считается устаревшим и пересобирается в фоне;
+# до пересборки главная показывает старый пул
+POPULAR_POOL_TIMEOUT = 60 * 60
+# Сколько пул живёт в кэше вообще (устаревший лучше, чем никакого)
+POPULAR_POOL_MAX_AGE = 60 * 60 * 24
+POPULAR_POOL_LOCK_TIMEOUT = 60 * 5
+
+
+def build_popular_pool(size=POPULAR_POOL_SIZE):
+    """
+    id топ продаваемых товаров: агрегат только по OrderItem, без JOIN
+    с товарами. Если продаж мало, пул добивается последними добавленными
+    товарами, чтобы на главной всегда было что показать.
+    """
+    ids = list(
+        OrderItem.objects.values("product_id")
+        .annotate(sold=Sum("quantity"))
+        .order_by("-sold", "-product_id")
+        .values_list("product_id", flat=True)[:size]
+    )
+    if len(ids) < size:
+        ids += list(
+            Product.objects.exclude(id__in=ids)
+            .order_by("-id")
+            .values_list("id", flat=True)[: size - len(ids)]
+        )
+    return ids
+
+
+def refresh_popular_pool(size=POPULAR_POOL_SIZE):
+    ids = build_popular_pool(size)
+    cache.set(
+        POPULAR_POOL_CACHE_KEY,
+        {"ids": ids, "built_at": time.time()},
+        POPULAR_POOL_MAX_AGE,
+    )
+    cache.delete(POPULAR_POOL_LOCK_KEY)
+    return ids
+
+
+@job_handler("refresh_popular_pool")
+def refresh_popular_pool_job(payload):
+    refresh_popular_pool(payload.get("size", POPULAR_POOL_SIZE))
+
+
+def invalidate_popular_pool():
+    """
+    Помечает пул устаревшим: следующий запрос главной поставит пересборку
+    в очередь, а пока покажет текущий пул (удалённые товары в него уже
+    не попадут — товары читаются по id на каждом запросе).
+    """
+    pool = cache.get(POPULAR_POOL_CACHE_KEY)
+    if pool is not None:
+        pool["built_at"] = 0
+        cache.set(POPULAR_POOL_CACHE_KEY, pool, POPULAR_POOL_MAX_AGE)
+
+
+def _popular_ids():
+    """
+    id из кэша; пересобирает пул только тот, кто взял блокировку: при
+    устаревшем пуле — в фоне (задача), при пустом кэше — сразу. Остальные
+    запросы в это время получают старый пул или новинки.
+    """
+    pool = cache.get(POPULAR_POOL_CACHE_KEY)
+    if pool is not None and time.time() - pool["built_at"] < POPULAR_POOL_TIMEOUT:
+        return pool["ids"]
+    if not cache.add(POPULAR_POOL_LOCK_KEY, True, POPULAR_POOL_LOCK_TIMEOUT):
+        return pool["ids"] if pool is not None else None
+    if pool is not None:
+        enqueue("refresh_popular_pool", {"size": POPULAR_POOL_SIZE})
+        return pool["ids"]
+    return refresh_popular_pool()
+
+
+def get_popular_products(count=4):
+    ids = _popular_ids()
+    products = Product.objects.only(*PRODUCT_CARD_FIELDS)
+    if ids is None:
+        return list(products.order_by("-id")[:count])
+    # С запасом на товары, удалённые после сборки пула
+    sample = random.sample(ids, min(count * 2, len(ids)))
+    found = products.in_bulk(sample)
+    return [found[product_id] for product_id in sample if product_id in found][:count]
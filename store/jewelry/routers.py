@@ -0,0 +1,152 @@
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+REPLICA_PIN_COOKIE = "db_pin"
+REPLICA_RETRY_AFTER = 30
+# Сколько живут кэши, заполненные с реплики: она могла ещё не догнать
+# запись, после которой кэш сбросили
+REPLICA_CACHE_TIMEOUT = 60
+
+# Реплика для чтения в текущем контексте; None — читаем с основной
+_read_alias = contextvars.ContextVar("jewelry_read_alias", default=None)
+# Состояние текущего запроса: {"wrote": bool, "pinned": bool}
+_request_state = contextvars.ContextVar("jewelry_db_state", default=None)
+# Только эти модели читаются с реплики. Сессии, пользователи и корзины —
+# всегда с основной: отставшая реплика разлогинила бы пользователя.
+REPLICA_MODELS = {"jewelry.category", "jewelry.product"}
+
+# alias -> время, до которого реплика считается недоступной
+_unhealthy = {}
+
+
+def replica_aliases():
+    return getattr(settings, "REPLICA_DATABASES", [])
+
+
+def _pinned_to_primary():
+    state = _request_state.get()
+    return state is not None and (state["wrote"] or state["pinned"])
+
+
+def _healthy_replica():
+    """
+    Случайная доступная реплика. Соединение берётся сразу (из пула это
+    дёшево), и упавшая реплика на REPLICA_RETRY_AFTER секунд выводится
+    из ротации, а чтение уходит на основную базу.
+    """
+    now = time.monotonic()
+    candidates = [
+        alias for alias in replica_aliases() if _unhealthy.get(alias, 0) <= now
+    ]
+    random.shuffle(candidates)
+    for alias in candidates:
+        try:
+            connections[alias].ensure_connection()
+        except OperationalError:
+            _unhealthy[alias] = now + REPLICA_RETRY_AFTER
+            continue
+        return alias
+    return None
+
+
+def reading_from_replica():
+    return _read_alias.get() is not None and not _pinned_to_primary()
+
+
+def cache_timeout(timeout):
+    """
+    timeout для cache.set с данными, прочитанными в текущем контексте.
+    """
+    if not reading_from_replica():
+        return timeout
+    if timeout is None:
+        return REPLICA_CACHE_TIMEOUT
+    return min(timeout, REPLICA_CACHE_TIMEOUT)
+
+
+@contextmanager
+def use_replica():
+    """
+    Чтения внутри блока идут на реплику, если пользователь недавно ничего
+    не записывал (иначе он мог бы не увидеть свои же изменения).
+    """
+    alias = None if _pinned_to_primary() else _healthy_replica()
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def replica_reads(view):
+    """
+    Декоратор для представлений, которые только читают каталог.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return view(request, *args, **kwargs)
+        with use_replica():
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Запись и всё, кроме чтения каталога внутри use_replica(), — на основную
+    базу.
+    После первой записи в запросе чтения тоже возвращаются на основную.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in REPLICA_MODELS or not reading_from_replica():
+            return DEFAULT_DB_ALIAS
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replica_aliases()
+
+
+class ReplicaPinMiddleware:
+    """
+    Read-your-writes: после запроса с записью браузер получает cookie, и
+    следующие REPLICA_PIN_SECONDS секунд его чтения идут на основную базу,
+    пока реплика догоняет.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {"wrote": False, "pinned": REPLICA_PIN_COOKIE in request.COOKIES}
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state["wrote"] and replica_aliases():
+            response.set_cookie(
+                REPLICA_PIN_COOKIE,
+                "1",
+                max_age=getattr(settings, "REPLICA_PIN_SECONDS", 5),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
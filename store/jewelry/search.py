@@ -0,0 +1,227 @@
+import re
+
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connections
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Product
+
+SEARCH_CONFIG = "english"
+SEARCH_VECTOR = SearchVector("name", weight="A", config=SEARCH_CONFIG) + SearchVector(
+    "description", weight="B", config=SEARCH_CONFIG
+)
+SEARCH_INDEX_NAME = "product_search_vector_gin"
+FTS_TABLE = "jewelry_product_fts"
+
+# Маркеры подсветки: вставляются БД, потом текст экранируется и они
+# заменяются на <mark>, чтобы описание товара не попало в HTML как есть.
+_START_SEL = "\x02"
+_STOP_SEL = "\x03"
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _is_postgres(using):
+    return connections[using].vendor == "postgresql"
+
+
+def _fts5_query(query):
+    """
+    Пользовательский ввод -> безопасный запрос FTS5: каждое слово в кавычках
+    с префиксным поиском, слова через AND.
+    """
+    return " ".join(f'"{word}"*' for word in _WORD_RE.findall(query))
+
+
+def _tsquery(query):
+    """
+    Тот же запрос для Postgres: to_tsquery с префиксом у каждого слова
+    ('word':* & ...), чтобы «diam» находил diamond, как в FTS5. Слова уже
+    без спецсимволов tsquery, поэтому кавычек достаточно.
+    """
+    words = _WORD_RE.findall(query)
+    if not words:
+        return None
+    return SearchQuery(
+        " & ".join(f"'{word.lower()}':*" for word in words),
+        search_type="raw",
+        config=SEARCH_CONFIG,
+    )
+
+
+def highlight(text):
+    return mark_safe(
+        escape(text or "").replace(_START_SEL, "<mark>").replace(_STOP_SEL, "</mark>")
+    )
+
+
+def install_search_index(using="default"):
+    """
+    Postgres: GIN-индекс по Product.search_vector.
+    SQLite (тесты, локальная разработка): виртуальная таблица FTS5.
+    Вызывается после каждого migrate, поэтому индексирует только товары,
+    которых в индексе ещё нет, а не всю таблицу.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if _is_postgres(using):
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX_NAME} "
+                f"ON {Product._meta.db_table} USING gin (search_vector)"
+            )
+        elif connection.vendor == "sqlite":
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                "USING fts5(name, description)"
+            )
+        else:
+            return
+    index_missing_products(using=using)
+
+
+def index_missing_products(using="default"):
+    connection = connections[using]
+    if _is_postgres(using):
+        Product.objects.using(using).filter(search_vector__isnull=True).update(
+            search_vector=SEARCH_VECTOR
+        )
+    elif connection.vendor == "sqlite":
+        table = Product._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+                f"SELECT id, name, description FROM {table} "
+                f"WHERE id NOT IN (SELECT rowid FROM {FTS_TABLE})"
+            )
+
+
+def index_products(ids=None, using="default"):
+    """
+    Пересчитывает поисковый индекс для товаров ids (или для всех).
+    Нужен после bulk_create/update, которые не вызывают сигналы.
+    """
+    connection = connections[using]
+    if _is_postgres(using):
+        queryset = Product.objects.using(using)
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        queryset.update(search_vector=SEARCH_VECTOR)
+    elif connection.vendor == "sqlite":
+        table = Product._meta.db_table
+        with connection.cursor() as cursor:
+            if ids is None:
+                cursor.execute(f"DELETE FROM {FTS_TABLE}")
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+                    f"SELECT id, name, description FROM {table}"
+                )
+                return
+            ids = list(ids)
+            if not ids:
+                return
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", ids
+            )
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+                f"SELECT id, name, description FROM {table} "
+                f"WHERE id IN ({placeholders})",
+                ids,
+            )
+
+
+def unindex_products(ids, using="default"):
+    connection = connections[using]
+    ids = list(ids)
+    if connection.vendor != "sqlite" or not ids:
+        return
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", ids)
+
+
+def filter_products(queryset, query):
+    """
+    Фильтр по полнотекстовому индексу без ранжирования (для админки и фасетов).
+    """
+    if _is_postgres(queryset.db):
+        search_query = _tsquery(query)
+        if search_query is None:
+            return queryset.none()
+        return queryset.filter(search_vector=search_query)
+    fts_query = _fts5_query(query)
+    if not fts_query:
+        return queryset.none()
+    return queryset.filter(
+        id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (fts_query,)
+        )
+    )
+
+
+def search_products(query, limit=24, offset=0, using="default"):
+    """
+    Товары по релевантности. У каждого товара есть .rank и .headline
+    (фрагмент описания с подсветкой найденных слов, уже экранированный).
+    """
+    query = (query or "").strip()
+    if not query:
+        return []
+
+    if _is_postgres(using):
+        search_query = _tsquery(query)
+        if search_query is None:
+            return []
+        products = list(
+            Product.objects.using(using)
+            .filter(search_vector=search_query)
+            .annotate(
+                rank=SearchRank(F("search_vector"), search_query),
+                headline=SearchHeadline(
+                    "description",
+                    search_query,
+                    config=SEARCH_CONFIG,
+                    start_sel=_START_SEL,
+                    stop_sel=_STOP_SEL,
+                    max_words=30,
+                    min_words=10,
+                ),
+            )
+            .order_by("-rank", "id")[offset : offset + limit]
+        )
+        for product in products:
+            product.headline = highlight(product.headline)
+        return products
+
+    fts_query = _fts5_query(query)
+    if not fts_query:
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, bm25({FTS_TABLE}, 10.0, 1.0), "
+            f"snippet({FTS_TABLE}, 1, %s, %s, '…', 30) "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            "ORDER BY 2, rowid LIMIT %s OFFSET %s",
+            [_START_SEL, _STOP_SEL, fts_query, limit, offset],
+        )
+        rows = cursor.fetchall()
+
+    found = Product.objects.using(using).in_bulk([row[0] for row in rows])
+    products = []
+    for product_id, rank, headline in rows:
+        product = found.get(product_id)
+        if product is None:
+            continue
+        # bm25 в SQLite: меньше — лучше
+        product.rank = -rank
+        product.headline = highlight(headline)
+        products.append(product)
+    return products
@@ -0,0 +1,214 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .catalog import adjust_facet_count, invalidate_nav_categories, price_band
+from .images import delete_derivatives, derivative_names
+from .inventory import invalidate_stock
+from .jobs import enqueue
+from .media import media_url_cache
+from .models import Category, Product
+from .page_cache import bump_versions
+from .popular import invalidate_popular_pool
+from .search import index_products, install_search_index, unindex_products
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def invalidate_image_cache(sender, instance, **kwargs):
+    if instance.image:
+        name = str(instance.image)
+        media_url_cache.invalidate(name)
+        for path in derivative_names(name):
+            media_url_cache.invalidate(path)
+
+
+def _delete_unused_derivatives(name):
+    # Одну картинку могут делить несколько товаров (импорт)
+    if (
+        Product.objects.filter(image=name).exists()
+        or Category.objects.filter(image=name).exists()
+    ):
+        return
+    try:
+        delete_derivatives(name)
+    except OSError:
+        logger.exception("Could not delete derivatives of %s", name)
+    for path in derivative_names(name):
+        media_url_cache.invalidate(path)
+
+
+@receiver(pre_save, sender=Category)
+def remember_previous_image(sender, instance, raw=False, **kwargs):
+    instance._previous_image = None
+    if instance.pk and not raw:
+        instance._previous_image = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("image", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def delete_replaced_derivatives(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, "_previous_image", None)
+    if raw or not previous or previous == str(instance.image or ""):
+        return
+    transaction.on_commit(lambda: _delete_unused_derivatives(previous))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def delete_removed_derivatives(sender, instance, **kwargs):
+    if instance.image:
+        name = str(instance.image)
+        transaction.on_commit(lambda: _delete_unused_derivatives(name))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def create_image_derivatives(sender, instance, created, raw=False, **kwargs):
+    """
+    Уменьшенные копии новой картинки делает воркер: задача ставится в той
+    же транзакции, что и сохранение, и видна воркерам только после коммита.
+    Сохранение с прежней картинкой ничего не ставит (пропущенные копии
+    досоздаёт generate_image_derivatives).
+    """
+    if raw or not instance.image:
+        return
+    name = str(instance.image)
+    if not created and getattr(instance, "_previous_image", None) == name:
+        return
+    enqueue("image_derivatives", {"name": name}, max_attempts=3)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, instance, using="default", **kwargs):
+    transaction.on_commit(invalidate_nav_categories, using=using)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_popular_products(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_popular_pool()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_stock_cache(sender, instance, **kwargs):
+    invalidate_stock([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, raw=False, using="default", **kwargs):
+    if not raw:
+        index_products([instance.pk], using=using)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_search_index(sender, instance, using="default", **kwargs):
+    unindex_products([instance.pk], using=using)
+
+
+def create_search_index(sender, using="default", **kwargs):
+    install_search_index(using=using)
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_state(sender, instance, raw=False, **kwargs):
+    instance._previous = instance._previous_image = None
+    if instance.pk and not raw:
+        instance._previous = (
+            Product.objects.filter(pk=instance.pk)
+            .values("category_id", "price", "slug", "category__slug", "image")
+            .first()
+        )
+        if instance._previous is not None:
+            instance._previous_image = instance._previous["image"]
+
+
+@receiver(post_save, sender=Product)
+def update_facet_counts(
+    sender, instance, created, raw=False, using="default", **kwargs
+):
+    """
+    Сдвигает счётчики фасетов после коммита (откат их не трогает) и только
+    если товар сменил категорию или ценовой диапазон.
+    """
+    if raw:
+        return
+    previous = getattr(instance, "_previous", None)
+    if previous is not None and (
+        previous["category_id"] == instance.category_id
+        and price_band(previous["price"]) == price_band(instance.price)
+    ):
+        return
+    category_id, price = instance.category_id, instance.price
+
+    def apply():
+        if previous is not None:
+            adjust_facet_count(previous["category_id"], previous["price"], -1)
+        adjust_facet_count(category_id, price, 1)
+
+    transaction.on_commit(apply, using=using)
+
+
+@receiver(post_delete, sender=Product)
+def decrement_facet_counts(sender, instance, using="default", **kwargs):
+    category_id, price = instance.category_id, instance.price
+    transaction.on_commit(
+        lambda: adjust_facet_count(category_id, price, -1), using=using
+    )
+
+
+def _product_page_names(instance):
+    names = {"listing", f"product:{instance.slug}"}
+    try:
+        names.add(f"category:{instance.category.slug}")
+    except Category.DoesNotExist:
+        pass
+    previous = getattr(instance, "_previous", None)
+    if previous is not None:
+        names.add(f"product:{previous['slug']}")
+        names.add(f"category:{previous['category__slug']}")
+    return names
+
+
+# Версии страниц поднимаются только после коммита: иначе гость между
+# bump и коммитом прочитает старую строку и закэширует её под новой версией
+@receiver(post_save, sender=Product)
+def bump_product_page_versions(
+    sender, instance, created, raw=False, using="default", **kwargs
+):
+    if raw:
+        return
+    names = _product_page_names(instance)
+    previous = getattr(instance, "_previous", None)
+    # Счётчики товаров в меню меняются при добавлении и переносе товара
+    if created or previous and previous["category_id"] != instance.category_id:
+        names.add("nav")
+    transaction.on_commit(lambda: bump_versions(*names), using=using)
+
+
+@receiver(post_delete, sender=Product)
+def bump_deleted_product_page_versions(sender, instance, using="default", **kwargs):
+    names = {"nav", *_product_page_names(instance)}
+    transaction.on_commit(lambda: bump_versions(*names), using=using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_category_page_versions(sender, instance, using="default", **kwargs):
+    names = ("nav", "listing", f"category:{instance.slug}")
+    transaction.on_commit(lambda: bump_versions(*names), using=using)
@@ -1,22 +1,42 @@
 from django import template
 from django.templatetags.static import static
-import os
-from django.conf import settings
+
+from jewelry.images import DEFAULT_FORMAT, IMAGE_SIZES, derivative_name
+from jewelry.media import resolve_media_name, resolve_media_url
 
 register = template.Library()
 
 
 @register.simple_tag
-def image_or_placeholder(field, placeholder="jewelry/images/default-product.webp"):
+def image_or_placeholder(
+    field, placeholder="jewelry/images/default-product.webp", size=None
+):
     """
     Возвращает URL картинки или заглушку, если файла нет/битый путь.
+    С size="thumb"/"card"/"detail" отдаёт уменьшенную копию, если она уже есть.
     """
     try:
-        if field and getattr(field, "url", None):
-            # путь на диске
-            filepath = os.path.join(settings.MEDIA_ROOT, str(field))
-            if os.path.exists(filepath):
-                return field.url
+        url = None
+        if size and field:
+            url = resolve_media_name(derivative_name(str(field), size))
+        url = url or resolve_media_url(field)
+        if url:
+            return url
     except Exception:
         pass
     return static(placeholder)
+
+
+@register.simple_tag
+def image_srcset(field, fmt=DEFAULT_FORMAT):
+    """
+    srcset со всеми существующими размерами картинки: "url 160w, url 480w, ...".
+    """
+    if not field:
+        return ""
+    entries = []
+    for size, width in IMAGE_SIZES.items():
+        url = resolve_media_name(derivative_name(str(field), size, fmt))
+        if url:
+            entries.append(f"{url} {width}w")
+    return ", ".join(entries)
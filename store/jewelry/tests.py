@@ -1,3 +1,539 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail import EmailMessage
+from django.http import HttpResponse
+from django.db import connection, connections, transaction
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from .cart import CART_MAX_QUANTITY, AnonymousCart, add_cart_items
+from .catalog import get_facet_counts
+from .forms import OrderForm
+from .inventory import OutOfStock, StockBusy
+from .jobs import (
+    JOB_BACKOFF_BASE,
+    JOB_STALE_AFTER,
+    claim_jobs,
+    enqueue,
+    release_stale_jobs,
+    run_pending,
+    send_mail_later,
+)
+from .models import CartItem, Category, CustomUser, Job, Order, OrderItem, Product
+from .orders import place_order
+from .routers import (
+    REPLICA_CACHE_TIMEOUT,
+    REPLICA_PIN_COOKIE,
+    ReplicaPinMiddleware,
+    cache_timeout,
+    use_replica,
+)
+from .throttle import LOGIN_THROTTLES, consume
+
+EMAIL = {"subject": "Hello", "body": "Body", "to": ["buyer@example.com"]}
+ORDER_DATA = {
+    "full_name": "Test Buyer",
+    "email": "buyer@example.com",
+    "phone": "5550000000",
+    "country": "Country",
+    "region": "Region",
+    "city": "City",
+    "postal_code": "12345",
+    "address": "1 Main Street",
+}
+
+
+def make_product(slug, stock=None, price=100):
+    category, _ = Category.objects.get_or_create(
+        slug="rings", defaults={"name": "Rings"}
+    )
+    return Product.objects.create(
+        name=slug.title(),
+        slug=slug,
+        description="",
+        price=price,
+        stock=stock,
+        category=category,
+    )
+
+
+def make_users(count):
+    return CustomUser.objects.bulk_create(
+        CustomUser(
+            username=f"buyer{n}",
+            email=f"buyer{n}@example.com",
+            phone=f"{5550000000 + n}",
+        )
+        for n in range(count)
+    )
+
+
+def order_form():
+    form = OrderForm(ORDER_DATA)
+    assert form.is_valid(), form.errors
+    return form
+
+
+def concurrent_writes_supported():
+    """
+    Параллельные записи из потоков: Postgres или SQLite в файле с
+    IMMEDIATE-транзакциями (общая in-memory база сразу отвечает
+    «table is locked»).
+    """
+    if connection.vendor == "postgresql":
+        return True
+    return (
+        connection.vendor == "sqlite"
+        and not connection.is_in_memory_db()
+        and connection.settings_dict["OPTIONS"].get("transaction_mode") == "IMMEDIATE"
+    )
+
+
+def run_concurrently(func, args):
+    """
+    Запускает func(arg) в отдельном потоке для каждого arg, все сразу.
+    Возвращает результаты в порядке args.
+    """
+    results = [None] * len(args)
+    barrier = threading.Barrier(len(args))
+
+    def worker(index, arg):
+        barrier.wait()
+        try:
+            results[index] = func(arg)
+        finally:
+            connections.close_all()
+
+    threads = [
+        threading.Thread(target=worker, args=(index, arg))
+        for index, arg in enumerate(args)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class JobQueueTests(TestCase):
+    def make_due(self):
+        Job.objects.update(run_at=timezone.now())
+
+    def test_enqueue_rejects_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            enqueue("no-such-kind", {})
+
+    def test_enqueue_is_rolled_back_with_the_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                send_mail_later("Hello", "Body", ["buyer@example.com"])
+                raise RuntimeError
+        self.assertFalse(Job.objects.exists())
+
+    def test_worker_sends_queued_email(self):
+        send_mail_later("Hello", "Body", ["buyer@example.com"])
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(run_pending("worker"), 1)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "Hello")
+        self.assertEqual(mail.outbox[0].to, ["buyer@example.com"])
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_batch_sends_every_email(self):
+        for n in range(3):
+            send_mail_later(f"Hello {n}", "Body", [f"buyer{n}@example.com"])
+
+        self.assertEqual(run_pending("worker"), 3)
+
+        self.assertEqual(
+            sorted(message.subject for message in mail.outbox),
+            ["Hello 0", "Hello 1", "Hello 2"],
+        )
+
+    def test_claim_takes_only_due_unclaimed_jobs(self):
+        due = enqueue("email", EMAIL)
+        enqueue("email", EMAIL, delay=timedelta(hours=1))
+
+        self.assertEqual([job.id for job in claim_jobs("first")], [due.id])
+        self.assertEqual(claim_jobs("second"), [])
+        due.refresh_from_db()
+        self.assertEqual(due.status, Job.RUNNING)
+        self.assertEqual(due.locked_by, "first")
+
+    def test_failed_job_is_retried_with_backoff(self):
+        send_mail_later("Hello", "Body", ["buyer@example.com"])
+        started = timezone.now()
+
+        with (
+            mock.patch.object(EmailMessage, "send", side_effect=ConnectionError),
+            self.assertLogs("jewelry.jobs", "WARNING"),
+        ):
+            run_pending("worker")
+
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("ConnectionError", job.last_error)
+        self.assertGreaterEqual(
+            job.run_at, started + timedelta(seconds=JOB_BACKOFF_BASE * 0.8)
+        )
+        self.assertEqual(len(mail.outbox), 0)
+        # До run_at задачу никто не берёт
+        self.assertEqual(run_pending("worker"), 0)
+
+        self.make_due()
+        run_pending("worker")
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_job_is_dead_lettered_after_max_attempts(self):
+        enqueue("email", EMAIL, max_attempts=2)
+
+        with (
+            mock.patch.object(EmailMessage, "send", side_effect=ConnectionError),
+            self.assertLogs("jewelry.jobs", "WARNING") as logs,
+        ):
+            for _ in range(2):
+                self.make_due()
+                run_pending("worker")
+
+        self.assertIn("failed for good", logs.output[-1])
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+        self.make_due()
+        self.assertEqual(run_pending("worker"), 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_stale_running_jobs_are_released(self):
+        job = enqueue("email", EMAIL)
+        claim_jobs("dead-worker")
+        Job.objects.update(locked_at=timezone.now() - JOB_STALE_AFTER * 2)
+
+        self.assertEqual(release_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertEqual(run_pending("worker"), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 2))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_job_that_keeps_hanging_fails_after_max_attempts(self):
+        job = enqueue("email", EMAIL, max_attempts=2)
+
+        with self.assertLogs("jewelry.jobs", "ERROR"):
+            for _ in range(2):
+                claim_jobs("dead-worker")
+                Job.objects.update(locked_at=timezone.now() - JOB_STALE_AFTER * 2)
+                release_stale_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(run_pending("worker"), 0)
+
+    def test_new_image_queues_derivatives_once(self):
+        product = make_product("ring")
+        product.image = "products/ring.jpg"
+        product.save()
+        product.name = "Ring"
+        product.save()
+
+        job = Job.objects.get()
+        self.assertEqual(
+            (job.kind, job.payload),
+            ("image_derivatives", {"name": "products/ring.jpg"}),
+        )
+
+
+# Реплика-зеркало в тестах — отдельное соединение, данных из транзакции
+# теста оно не видит: страницы читают с основной базы
+@override_settings(REPLICA_DATABASES=[])
+class PageCacheTests(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_page_changes_only_after_commit(self):
+        product = make_product("ring")
+        url = reverse("product_detail", kwargs={"slug": product.slug})
+        before = self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = "Renamed Ring"
+            product.save()
+            # До коммита гость получает старую страницу из кэша, и новая
+            # версия не может закэшировать незакоммиченные данные
+            during = self.client.get(url)
+            self.assertEqual(during["ETag"], before["ETag"])
+            self.assertNotContains(during, "Renamed Ring")
+
+        after = self.client.get(url)
+        self.assertNotEqual(after["ETag"], before["ETag"])
+        self.assertContains(after, "Renamed Ring")
+
+
+class FacetCountTests(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_counts_move_only_on_commit(self):
+        product = make_product("ring", price=50)
+        cheap, mid = (product.category_id, 0), (product.category_id, 1)
+        self.assertEqual(get_facet_counts()[cheap], 1)
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                product.price = 200
+                product.save()
+                raise RuntimeError
+        self.assertEqual(get_facet_counts()[cheap], 1)
+
+        product.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            product.price = 200
+            product.save()
+            self.assertEqual(get_facet_counts()[cheap], 1)
+        counts = get_facet_counts()
+        self.assertEqual((counts[cheap], counts[mid]), (0, 1))
+
+        # Цена в том же диапазоне — счётчики не трогаются
+        with (
+            mock.patch("jewelry.signals.adjust_facet_count") as adjust,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            product.price = 300
+            product.save()
+        adjust.assert_not_called()
+
+
+@override_settings(
+    CACHES={
+        **settings.CACHES,
+        "throttle": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    },
+    THROTTLE_CACHE="throttle",
+)
+class ThrottleTests(SimpleTestCase):
+    def test_sustained_attack_never_regains_the_burst(self):
+        throttle = next(t for t in LOGIN_THROTTLES if t.scope == "login_user")
+        seconds = 660
+        clock = [1_000_000.0]
+        allowed = 0
+        # Подменённое time.time двигает и TTL в LocMemCache
+        with mock.patch("time.time", lambda: clock[0]):
+            for _ in range(seconds):
+                if not consume(throttle, "victim"):
+                    allowed += 1
+                clock[0] += 1
+        # burst сразу, дальше одна попытка в period
+        expected = throttle.burst + seconds // throttle.period
+        self.assertLessEqual(abs(allowed - expected), 1)
+
+
+@skipUnless(settings.REPLICA_DATABASES, "needs a replica (TEST MIRROR of default)")
+class ReplicaRoutingTests(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.replica = settings.REPLICA_DATABASES[0]
+        self.factory = RequestFactory()
+
+    def request(self, view, **cookies):
+        request = self.factory.get("/")
+        request.COOKIES.update(cookies)
+        return ReplicaPinMiddleware(view)(request)
+
+    def test_catalog_reads_go_to_the_replica_inside_use_replica(self):
+        with use_replica():
+            self.assertEqual(Product.objects.all().db, self.replica)
+            # Корзины и пользователи — всегда с основной
+            self.assertEqual(CartItem.objects.all().db, "default")
+        self.assertEqual(Product.objects.all().db, "default")
+
+    def test_write_pins_the_client_to_the_primary(self):
+        reads = []
+
+        def read(request):
+            with use_replica():
+                reads.append(Product.objects.all().db)
+            return HttpResponse()
+
+        def write_then_read(request):
+            send_mail_later(**EMAIL)
+            return read(request)
+
+        response = self.request(write_then_read)
+        self.assertEqual(reads.pop(), "default")
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+
+        self.request(read, **{REPLICA_PIN_COOKIE: "1"})
+        self.assertEqual(reads.pop(), "default")
+
+        response = self.request(read)
+        self.assertEqual(reads.pop(), self.replica)
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_cache_timeout_is_capped_on_replica_reads(self):
+        self.assertEqual(cache_timeout(3600), 3600)
+        self.assertIsNone(cache_timeout(None))
+        with use_replica():
+            self.assertEqual(cache_timeout(3600), REPLICA_CACHE_TIMEOUT)
+            self.assertEqual(cache_timeout(None), REPLICA_CACHE_TIMEOUT)
+            self.assertEqual(cache_timeout(10), 10)
+
+
+class StockReservationTests(TestCase):
+    def test_order_reserves_stock(self):
+        product = make_product("ring", stock=3)
+        user = make_users(1)[0]
+        CartItem.objects.create(user=user, product=product, quantity=2)
+
+        order = place_order(order_form(), user)
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 1)
+        self.assertEqual(order.item_count, 2)
+        self.assertFalse(CartItem.objects.filter(user=user).exists())
+
+    def test_failed_reservation_rolls_back_the_order(self):
+        available = make_product("ring", stock=5)
+        scarce = make_product("brooch", stock=1)
+        user = make_users(1)[0]
+        CartItem.objects.create(user=user, product=available, quantity=2)
+        CartItem.objects.create(user=user, product=scarce, quantity=2)
+
+        with self.assertRaises(OutOfStock) as raised:
+            place_order(order_form(), user)
+
+        self.assertEqual(raised.exception.product_ids, [scarce.id])
+        available.refresh_from_db()
+        scarce.refresh_from_db()
+        self.assertEqual((available.stock, scarce.stock), (5, 1))
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(CartItem.objects.filter(user=user).count(), 2)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    buyers = 12
+    stock = 5
+
+    def setUp(self):
+        if not concurrent_writes_supported():
+            self.skipTest("needs a database that takes concurrent writes")
+
+    def test_stock_is_never_oversold(self):
+        product = make_product("one-of-a-kind", stock=self.stock)
+        users = make_users(self.buyers)
+        CartItem.objects.bulk_create(
+            CartItem(user=user, product=product, quantity=1) for user in users
+        )
+
+        def buy(user):
+            try:
+                place_order(order_form(), user)
+                return "placed"
+            except (OutOfStock, StockBusy):
+                return "rejected"
+
+        results = run_concurrently(buy, users)
+
+        product.refresh_from_db()
+        placed = results.count("placed")
+        self.assertGreaterEqual(product.stock, 0)
+        self.assertEqual(placed + product.stock, self.stock)
+        self.assertEqual(Order.objects.count(), placed)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), placed)
+        # Отказавшие заказы откатились целиком: корзины на месте
+        self.assertEqual(CartItem.objects.count(), self.buyers - placed)
+
+
+class CartTests(TestCase):
+    def test_add_increments_the_existing_line(self):
+        ring = make_product("ring")
+        user = make_users(1)[0]
+
+        add_cart_items(user, {ring.id: 2})
+        add_cart_items(user, {ring.id: 3})
+
+        line = CartItem.objects.get(user=user)
+        self.assertEqual((line.product_id, line.quantity), (ring.id, 5))
+
+    def test_add_is_capped_at_max_quantity(self):
+        ring = make_product("ring")
+        user = make_users(1)[0]
+
+        add_cart_items(user, {ring.id: CART_MAX_QUANTITY - 1})
+        add_cart_items(user, {ring.id: 5})
+        self.assertEqual(CartItem.objects.get(user=user).quantity, CART_MAX_QUANTITY)
+
+        anonymous_cart = AnonymousCart(RequestFactory().get("/"))
+        anonymous_cart.add(ring.id, CART_MAX_QUANTITY - 1)
+        anonymous_cart.add(ring.id, 5)
+        self.assertEqual(anonymous_cart.items, {ring.id: CART_MAX_QUANTITY})
+
+    def test_update_rejects_non_integer_values(self):
+        ring = make_product("ring")
+        for change in (
+            {"product_id": ring.id, "quantity": 1e999},
+            {"product_id": ring.id, "quantity": 2.5},
+            {"product_id": ring.id, "quantity": True},
+            {"product_id": str(ring.id), "quantity": 1},
+        ):
+            response = self.client.post(
+                reverse("update_cart"),
+                json.dumps({"changes": [change]}),
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 400, change)
+
+
+class ConcurrentCartTests(TransactionTestCase):
+    threads = 8
+    adds = 10
+
+    def setUp(self):
+        if not concurrent_writes_supported():
+            self.skipTest("needs a database that takes concurrent writes")
+
+    def test_concurrent_increments_are_not_lost(self):
+        ring = make_product("ring")
+        brooch = make_product("brooch")
+        user = make_users(1)[0]
+
+        def add(index):
+            for n in range(self.adds):
+                product = ring if (index + n) % 2 else brooch
+                add_cart_items(user, {product.id: 1})
+
+        run_concurrently(add, list(range(self.threads)))
+
+        quantities = dict(
+            CartItem.objects.filter(user=user).values_list("product", "quantity")
+        )
+        half = self.threads * self.adds // 2
+        self.assertEqual(quantities, {ring.id: half, brooch.id: half})
@@ -0,0 +1,159 @@
+import hashlib
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import registry
+
+
+class Throttle:
+    """
+    Token bucket: burst попыток сразу, дальше по одной раз в period секунд.
+    Хранится как GCRA — одно число «теоретическое время следующей попытки»
+    (TAT), которое двигается атомарным cache.incr, без чтения-изменения-записи.
+    """
+
+    def __init__(self, scope, burst, period, key):
+        self.scope = scope
+        self.burst = burst
+        self.period = period
+        self.key = key
+
+    def cache_key(self, identity):
+        digest = hashlib.sha256(identity.encode()).hexdigest()[:32]
+        return f"jewelry:throttle:{self.scope}:{digest}"
+
+
+class LocalBuckets:
+    """
+    Те же корзины в памяти процесса под блокировкой — на случай, если
+    общий кэш недоступен. Лимит тогда действует на каждый процесс отдельно.
+    """
+
+    max_entries = 10_000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tats = {}
+
+    def consume(self, key, now_ms, interval_ms, limit_ms):
+        with self.lock:
+            if len(self.tats) > self.max_entries:
+                self.tats = {k: v for k, v in self.tats.items() if v > now_ms}
+            tat = max(self.tats.get(key, now_ms), now_ms)
+            if tat + interval_ms - now_ms > limit_ms:
+                return tat + interval_ms - now_ms - limit_ms
+            self.tats[key] = tat + interval_ms
+            return 0
+
+
+local_buckets = LocalBuckets()
+
+
+def _consume_shared(cache, key, now_ms, interval_ms, limit_ms, timeout):
+    """
+    Возвращает, сколько миллисекунд ждать (0 — попытка разрешена).
+    """
+    try:
+        tat = cache.incr(key, interval_ms)
+    except ValueError:
+        # Ключа нет: корзина полная
+        if cache.add(key, now_ms + interval_ms, timeout):
+            return 0
+        tat = cache.incr(key, interval_ms)
+    if tat - interval_ms < now_ms:
+        # Корзина простаивала и снова полная; гонка здесь стоит максимум
+        # нескольких лишних попыток
+        cache.set(key, now_ms + interval_ms, timeout)
+        return 0
+    wait = tat - now_ms - limit_ms
+    if wait > 0:
+        # Отклонённая попытка не должна сдвигать окно
+        cache.decr(key, interval_ms)
+        return wait
+    # incr не продлевает TTL: без touch ключ истёк бы через timeout после
+    # первой попытки, и непрерывная атака снова получала бы полный burst
+    cache.touch(key, timeout)
+    return 0
+
+
+def consume(throttle, identity):
+    """
+    Секунды до следующей разрешённой попытки; 0 — можно.
+    """
+    now_ms = int(time.time() * 1000)
+    interval_ms = int(throttle.period * 1000)
+    limit_ms = interval_ms * throttle.burst
+    key = throttle.cache_key(identity)
+    timeout = math.ceil(throttle.period * (throttle.burst + 1))
+    try:
+        cache = caches[getattr(settings, "THROTTLE_CACHE", "default")]
+        wait = _consume_shared(cache, key, now_ms, interval_ms, limit_ms, timeout)
+    except Exception:
+        registry.inc("jewelry_throttle_fallback_total", {"scope": throttle.scope})
+        wait = local_buckets.consume(key, now_ms, interval_ms, limit_ms)
+    return math.ceil(wait / 1000)
+
+
+def client_ip(request):
+    if getattr(settings, "THROTTLE_TRUST_X_FORWARDED_FOR", False):
+        forwarded = request.headers.get("X-Forwarded-For", "")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def posted_username(request):
+    return request.POST.get("username", "").strip().lower() or None
+
+
+LOGIN_THROTTLES = (
+    Throttle("login_ip", burst=20, period=6, key=client_ip),
+    Throttle("login_user", burst=10, period=30, key=posted_username),
+)
+REGISTER_THROTTLES = (Throttle("register_ip", burst=5, period=60, key=client_ip),)
+
+
+def check_throttles(request, throttles):
+    """
+    Пропускает запрос через все корзины; возвращает Retry-After в секундах
+    или 0. Сработавшие отказы считаются в метриках.
+    """
+    retry_after = 0
+    for throttle in throttles:
+        identity = throttle.key(request)
+        if not identity:
+            continue
+        wait = consume(throttle, identity)
+        if wait:
+            registry.inc("jewelry_throttled_requests_total", {"scope": throttle.scope})
+            retry_after = max(retry_after, wait)
+    return retry_after
+
+
+def throttle_post(throttles, rejected):
+    """
+    Декоратор для форм входа/регистрации: POST сверх лимита сразу уходит в
+    rejected(request, retry_after) с 429 — до валидации формы и хэширования
+    пароля.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method == "POST" and getattr(settings, "THROTTLE_ENABLED", True):
+                retry_after = check_throttles(request, throttles)
+                if retry_after:
+                    response = rejected(request, retry_after)
+                    response.status_code = 429
+                    response["Retry-After"] = str(retry_after)
+                    return response
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,7 +1,7 @@
 from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
-from . import views
+from . import api, metrics, views
 
 urlpatterns = [
     path("", views.index, name="home"),
@@ -11,19 +11,26 @@ urlpatterns = [
     path("products/", views.products, name="products"),
     path("category/<slug:slug>/", views.category_view, name="category"),
     path("product/<slug:slug>/", views.product_detail, name="product_detail"),
+    path("search/", views.search, name="search"),
+    path("api/search/", views.search_api, name="search_api"),
+    path("api/products/", api.products, name="api_products"),
+    path("api/categories/", api.categories, name="api_categories"),
     path("cart/", views.cart, name="cart"),
     path("cart/add/<int:product_id>/", views.add_to_cart, name="add_to_cart"),
     path(
         "cart/remove/<int:product_id>/", views.remove_from_cart, name="remove_from_cart"
     ),
+    path("cart/update/", views.update_cart, name="update_cart"),
     path(
         "cart/update/<int:product_id>/", views.update_cart_item, name="update_cart_item"
     ),
     path("cart/clear/", views.clear_cart, name="clear_cart"),
     path("checkout/", views.checkout, name="checkout"),
+    path("orders/", views.order_history, name="order_history"),
     path("thank-you/", views.thank_you, name="thank_you"),
     path("about/", views.about, name="about"),
     path("contacts/", views.contacts, name="contacts"),
+    path("metrics", metrics.metrics_view, name="metrics"),
 ]
 
 if settings.DEBUG:
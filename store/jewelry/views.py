@@ -1,20 +1,59 @@
+import json
+from decimal import Decimal
+
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Category, Product, CartItem, OrderItem
+from django.db.models import Prefetch
+from .models import Category, Product, CartItem, Order, OrderItem
 from .forms import (
     OrderForm,
     ContactForm,
     CustomUserCreationForm,
     CustomAuthenticationForm,
 )
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.contrib import messages
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
+from .cart import (
+    AnonymousCart,
+    add_cart_items,
+    apply_cart_changes,
+    clamp_quantity,
+    get_cart_lines,
+    get_cart_summary,
+    get_cart_total,
+    merge_anonymous_cart,
+    set_cart_item_quantity,
+)
+from .catalog import (
+    CATALOG_PARAMS,
+    apply_catalog_filters,
+    catalog_facets,
+    get_nav_categories,
+    parse_catalog_filters,
+)
+from .inventory import LOW_STOCK, OutOfStock, StockBusy, get_stock_levels
+from .jobs import send_contact_message
+from .orders import place_order
+from .page_cache import versioned_page
+from .pagination import (
+    ORDER_HISTORY_ORDERING,
+    ORDERS_PER_PAGE,
+    InvalidCursor,
+    keyset_paginate,
+    paginate_products,
+)
+from .popular import get_popular_products
+from .routers import replica_reads, use_replica
+from .search import search_products
+from .throttle import LOGIN_THROTTLES, REGISTER_THROTTLES, throttle_post
 
 
+@replica_reads
 def index(request):
-    categories = Category.objects.all()
-    popular_products = Product.objects.order_by("?")[:4]
+    categories = get_nav_categories()
+    popular_products = get_popular_products(4)
     return render(
         request,
         "jewelry/index.html",
@@ -22,25 +61,55 @@ def index(request):
     )
 
 
+def _login_and_merge_cart(request, user):
+    anonymous_cart = AnonymousCart(request)
+    login(request, user)
+    merge_anonymous_cart(user, anonymous_cart)
+
+    redirect_to = request.POST.get("next", request.GET.get("next", ""))
+    if not url_has_allowed_host_and_scheme(
+        redirect_to,
+        allowed_hosts={request.get_host()},
+        require_https=request.is_secure(),
+    ):
+        redirect_to = "home"
+    return anonymous_cart.save(redirect(redirect_to))
+
+
+def _throttled_register(request, retry_after):
+    return render(
+        request,
+        "registration/register.html",
+        {"form": CustomUserCreationForm(), "retry_after": retry_after},
+    )
+
+
+def _throttled_login(request, retry_after):
+    return render(
+        request,
+        "registration/login.html",
+        {"form": CustomAuthenticationForm(), "retry_after": retry_after},
+    )
+
+
+@throttle_post(REGISTER_THROTTLES, _throttled_register)
 def register(request):
     if request.method == "POST":
         form = CustomUserCreationForm(request.POST)
         if form.is_valid():
             user = form.save()
-            login(request, user)
-            return redirect("home")
+            return _login_and_merge_cart(request, user)
     else:
         form = CustomUserCreationForm()
     return render(request, "registration/register.html", {"form": form})
 
 
+@throttle_post(LOGIN_THROTTLES, _throttled_login)
 def user_login(request):
     if request.method == "POST":
         form = CustomAuthenticationForm(request, data=request.POST)
         if form.is_valid():
-            user = form.get_user()
-            login(request, user)
-            return redirect("home")
+            return _login_and_merge_cart(request, form.get_user())
         else:
             messages.error(request, "❌ Invalid login credentials. Please try again.")
     else:
@@ -53,33 +122,135 @@ def user_logout(request):
     return redirect("home")
 
 
+@versioned_page("nav", "listing", params=CATALOG_PARAMS)
+@replica_reads
 def products(request):
-    products = Product.objects.all()
-    return render(request, "jewelry/products.html", {"products": products})
+    filters = parse_catalog_filters(request.GET)
+    page, sort = paginate_products(
+        request, apply_catalog_filters(Product.objects.all(), filters)
+    )
+    return render(
+        request,
+        "jewelry/products.html",
+        {
+            "products": page,
+            "page": page,
+            "sort": sort,
+            "facets": catalog_facets(filters),
+        },
+    )
 
 
+@versioned_page("nav", "category:{slug}", params=CATALOG_PARAMS)
+@replica_reads
 def category_view(request, slug):
     category = get_object_or_404(Category, slug=slug)
-    products = category.products.all()
+    filters = parse_catalog_filters(request.GET)
+    filters.pop("category", None)
+    page, sort = paginate_products(
+        request, apply_catalog_filters(category.products.all(), filters)
+    )
     return render(
-        request, "jewelry/category.html", {"category": category, "products": products}
+        request,
+        "jewelry/category.html",
+        {
+            "category": category,
+            "products": page,
+            "page": page,
+            "sort": sort,
+            "facets": catalog_facets(filters, category),
+        },
     )
 
 
 def get_categories(request):
-    categories = Category.objects.all()
-    return {"categories": categories}
+    with use_replica():
+        return {"categories": get_nav_categories()}
+
+
+def get_cart_info(request):
+    if request.user.is_authenticated:
+        cart_count, cart_total = get_cart_summary(request.user)
+    else:
+        cart_count, cart_total = AnonymousCart(request).summary()
+    return {"cart_count": cart_count, "cart_total": cart_total}
 
 
+@versioned_page("nav", "product:{slug}")
+@replica_reads
 def product_detail(request, slug):
     product = get_object_or_404(Product, slug=slug)
-    return render(request, "jewelry/product_detail.html", {"product": product})
+    stock = get_stock_levels([product.id]).get(product.id)
+    return render(
+        request,
+        "jewelry/product_detail.html",
+        {"product": product, "stock": stock, "low_stock": LOW_STOCK},
+    )
+
+
+SEARCH_RESULTS_PER_PAGE = 24
+
+
+def _search_page(request):
+    query = request.GET.get("q", "").strip()[:200]
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+    results = search_products(
+        query,
+        limit=SEARCH_RESULTS_PER_PAGE + 1,
+        offset=(page - 1) * SEARCH_RESULTS_PER_PAGE,
+    )
+    has_next = len(results) > SEARCH_RESULTS_PER_PAGE
+    return query, page, results[:SEARCH_RESULTS_PER_PAGE], has_next
+
+
+def search(request):
+    query, page, results, has_next = _search_page(request)
+    return render(
+        request,
+        "jewelry/search.html",
+        {
+            "query": query,
+            "results": results,
+            "page_number": page,
+            "has_next": has_next,
+        },
+    )
+
+
+def search_api(request):
+    query, page, results, has_next = _search_page(request)
+    return JsonResponse(
+        {
+            "query": query,
+            "page": page,
+            "has_next": has_next,
+            "results": [
+                {
+                    "id": product.id,
+                    "name": product.name,
+                    "slug": product.slug,
+                    "price": product.price,
+                    "rank": product.rank,
+                    "headline": product.headline,
+                }
+                for product in results
+            ],
+        }
+    )
 
 
-@login_required
 def cart(request):
-    cart_items = CartItem.objects.all()
-    total_price = sum(item.total_price() for item in cart_items)
+    if request.user.is_authenticated:
+        cart_items = list(get_cart_lines(request.user))
+    else:
+        cart_items = AnonymousCart(request).lines()
+    stock = get_stock_levels([item.product.id for item in cart_items])
+    for item in cart_items:
+        item.stock = stock.get(item.product.id)
+    total_price = sum((item.line_total for item in cart_items), Decimal("0.00"))
     return render(
         request,
         "jewelry/cart.html",
@@ -87,77 +258,185 @@ def cart(request):
     )
 
 
-@login_required
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id)
-    cart_item, created = CartItem.objects.get_or_create(product=product)
 
-    if created:
-        cart_item.quantity = 1
-    else:
-        cart_item.quantity += 1
+    if not request.user.is_authenticated:
+        anonymous_cart = AnonymousCart(request)
+        anonymous_cart.add(product.id)
+        return anonymous_cart.save(redirect("cart"))
 
-    cart_item.save()
+    add_cart_items(request.user, {product.id: 1})
     return redirect("cart")
 
 
-@login_required
 def remove_from_cart(request, product_id):
-    cart_item = get_object_or_404(CartItem, product_id=product_id)
+    if not request.user.is_authenticated:
+        anonymous_cart = AnonymousCart(request)
+        anonymous_cart.remove(product_id)
+        return anonymous_cart.save(redirect("cart"))
+
+    cart_item = get_object_or_404(CartItem, user=request.user, product_id=product_id)
     cart_item.delete()
     return redirect("cart")
 
 
+def _update_anonymous_cart_item(request, product_id, quantity):
+    anonymous_cart = AnonymousCart(request)
+    if product_id not in anonymous_cart.items:
+        return JsonResponse({"success": False, "error": "Not in cart"}, status=404)
+    anonymous_cart.set(product_id, quantity)
+
+    lines = {line.product.id: line for line in anonymous_cart.lines()}
+    line = lines.get(product_id)
+    response = JsonResponse(
+        {
+            "success": True,
+            "quantity": quantity if line else 0,
+            "total_price": line.line_total if line else Decimal("0.00"),
+            "cart_total": sum(
+                (item.line_total for item in lines.values()), Decimal("0.00")
+            ),
+        }
+    )
+    return anonymous_cart.save(response)
+
+
 def update_cart_item(request, product_id):
     if request.method == "POST":
-        quantity = int(request.POST.get("quantity", 1))
-        cart_item = get_object_or_404(CartItem, product_id=product_id)
+        try:
+            quantity = clamp_quantity(request.POST.get("quantity", 1))
+        except (ValueError, TypeError):
+            return JsonResponse(
+                {"success": False, "error": "Invalid quantity"}, status=400
+            )
 
-        if quantity >= 1:
-            cart_item.quantity = quantity
-            cart_item.save()
-        else:
-            cart_item.delete()
+        if not request.user.is_authenticated:
+            return _update_anonymous_cart_item(request, product_id, quantity)
 
-        total_price = sum(item.total_price() for item in CartItem.objects.all())
+        if not set_cart_item_quantity(request.user, product_id, quantity):
+            raise Http404("Not in cart")
+        line = get_cart_lines(request.user).filter(product_id=product_id).first()
 
         return JsonResponse(
             {
                 "success": True,
-                "quantity": cart_item.quantity,
-                "total_price": cart_item.total_price(),
-                "cart_total": total_price,
+                "quantity": line.quantity if line else 0,
+                "total_price": line.line_total if line else Decimal("0.00"),
+                "cart_total": get_cart_total(request.user),
             }
         )
 
     return JsonResponse({"success": False, "error": "Invalid request"})
 
 
-@login_required
+CART_BATCH_MAX_CHANGES = 100
+
+
+def _parse_cart_changes(body):
+    payload = json.loads(body)
+    if isinstance(payload, dict):
+        payload = payload.get("changes")
+    if not isinstance(payload, list) or len(payload) > CART_BATCH_MAX_CHANGES:
+        raise ValueError("Invalid changes")
+    changes = {}
+    for change in payload:
+        product_id, quantity = change["product_id"], change["quantity"]
+        # Только настоящие целые: bool — подкласс int, а float вроде 1e999
+        # (inf) роняет int() с OverflowError
+        if type(product_id) is not int or type(quantity) is not int:
+            raise TypeError("Expected integers")
+        if not 0 < product_id < 2**63:
+            raise ValueError("Invalid product id")
+        # последнее изменение по товару побеждает
+        changes[product_id] = clamp_quantity(quantity)
+    return changes
+
+
+def update_cart(request):
+    if request.method != "POST":
+        return JsonResponse({"success": False, "error": "Invalid request"})
+    try:
+        changes = _parse_cart_changes(request.body)
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({"success": False, "error": "Invalid changes"}, status=400)
+
+    if request.user.is_authenticated:
+        lines = apply_cart_changes(request.user, changes)
+        cart_total = get_cart_total(request.user)
+    else:
+        anonymous_cart = AnonymousCart(request)
+        for product_id, quantity in changes.items():
+            if product_id in anonymous_cart.items:
+                anonymous_cart.set(product_id, quantity)
+        lines = {line.product.id: line for line in anonymous_cart.lines()}
+        cart_total = sum((line.line_total for line in lines.values()), Decimal("0.00"))
+
+    response = JsonResponse(
+        {
+            "success": True,
+            "items": [
+                {
+                    "product_id": product_id,
+                    "quantity": (
+                        lines[product_id].quantity if product_id in lines else 0
+                    ),
+                    "total_price": (
+                        lines[product_id].line_total
+                        if product_id in lines
+                        else Decimal("0.00")
+                    ),
+                }
+                for product_id in changes
+            ],
+            "cart_total": cart_total,
+        }
+    )
+    if not request.user.is_authenticated:
+        anonymous_cart.save(response)
+    return response
+
+
 def clear_cart(request):
-    CartItem.objects.all().delete()
     messages.success(request, "Cart successfully emptied!")
+    if not request.user.is_authenticated:
+        anonymous_cart = AnonymousCart(request)
+        anonymous_cart.clear()
+        return anonymous_cart.save(redirect("cart"))
+
+    CartItem.objects.filter(user=request.user).delete()
     return redirect("cart")
 
 
+@login_required
 def checkout(request):
-    cart_items = CartItem.objects.all()
+    cart_items = list(get_cart_lines(request.user))
 
     if not cart_items:
         return redirect("cart")
 
-    total_price = sum(item.total_price() for item in cart_items)
+    total_price = sum((item.line_total for item in cart_items), Decimal("0.00"))
 
     if request.method == "POST":
         form = OrderForm(request.POST)
         if form.is_valid():
-            order = form.save()
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order, product=item.product, quantity=item.quantity
+            try:
+                order = place_order(form, request.user)
+            except OutOfStock as exc:
+                names = ", ".join(
+                    item.product.name
+                    for item in cart_items
+                    if item.product_id in exc.product_ids
                 )
-            cart_items.delete()
-
+                messages.error(request, f"Sorry, not enough stock left: {names}.")
+                return redirect("cart")
+            except StockBusy:
+                messages.error(
+                    request, "This item is in high demand right now, please retry."
+                )
+                return redirect("cart")
+            if order is None:
+                return redirect("cart")
             return redirect("thank_you")
     else:
         form = OrderForm()
@@ -169,6 +448,25 @@ def checkout(request):
     )
 
 
+@login_required
+def order_history(request):
+    # Страница — диапазон индекса order_user_created_idx плюс одна выборка
+    # позиций; сумма и число единиц уже лежат в самом заказе
+    orders = Order.objects.filter(user=request.user).prefetch_related(
+        Prefetch("order_items", queryset=OrderItem.objects.select_related("product"))
+    )
+    try:
+        page = keyset_paginate(
+            orders,
+            ORDER_HISTORY_ORDERING,
+            request.GET.get("cursor"),
+            ORDERS_PER_PAGE,
+        )
+    except InvalidCursor:
+        page = keyset_paginate(orders, ORDER_HISTORY_ORDERING, None, ORDERS_PER_PAGE)
+    return render(request, "jewelry/order_history.html", {"page": page})
+
+
 def thank_you(request):
     return render(request, "jewelry/thank_you.html")
 
@@ -181,6 +479,7 @@ def contacts(request):
     if request.method == "POST":
         form = ContactForm(request.POST)
         if form.is_valid():
+            send_contact_message(form.cleaned_data)
             messages.success(request, "✅ Your message has been successfully sent!")
             return redirect("contacts")
     else:
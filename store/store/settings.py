@@ -33,18 +33,20 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "jewelry.routers.ReplicaPinMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "jewelry.metrics.MetricsMiddleware",
 ]
 
 ROOT_URLCONF = "store.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "jewelry.metrics.InstrumentedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -54,6 +56,7 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
                 "jewelry.views.get_categories",
+                "jewelry.views.get_cart_info",
             ],
         },
     },
@@ -64,17 +67,57 @@ WSGI_APPLICATION = "store.wsgi.application"
 
 # Database
 
-DATABASES = {
-    "default": {
+# Pooled connections (psycopg 3 pool) are checked before being handed out;
+# without the pool, persistent connections use CONN_HEALTH_CHECKS instead.
+DATABASE_POOL = config("DATABASE_POOL", default=True, cast=bool)
+
+
+def _database(host, port):
+    database = {
         "ENGINE": "django.db.backends.postgresql",
         "NAME": config("DATABASE_NAME"),
         "USER": config("DATABASE_USER"),
         "PASSWORD": config("DATABASE_PASSWORD"),
-        "HOST": config("DATABASE_HOST"),
-        "PORT": config("DATABASE_PORT", cast=int),
+        "HOST": host,
+        "PORT": port,
     }
+    if DATABASE_POOL:
+        from psycopg_pool import ConnectionPool
+
+        database["OPTIONS"] = {
+            "pool": {
+                "min_size": config("DATABASE_POOL_MIN_SIZE", default=2, cast=int),
+                "max_size": config("DATABASE_POOL_MAX_SIZE", default=10, cast=int),
+                "timeout": config("DATABASE_POOL_TIMEOUT", default=10, cast=int),
+                "check": ConnectionPool.check_connection,
+            }
+        }
+    else:
+        database["CONN_MAX_AGE"] = config("CONN_MAX_AGE", default=60, cast=int)
+        database["CONN_HEALTH_CHECKS"] = True
+    return database
+
+
+DATABASES = {
+    "default": _database(config("DATABASE_HOST"), config("DATABASE_PORT", cast=int)),
 }
 
+# Read replicas for catalog pages: "host1:5432,host2:5432". Same database
+# name and credentials as the primary; tests mirror them to "default".
+for index, replica in enumerate(
+    filter(None, config("DATABASE_REPLICAS", default="").split(","))
+):
+    replica_host, _, replica_port = replica.strip().partition(":")
+    DATABASES[f"replica_{index + 1}"] = {
+        **_database(replica_host, int(replica_port or 5432)),
+        "TEST": {"MIRROR": "default"},
+    }
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["jewelry.routers.ReplicaRouter"]
+# How long a client reads from the primary after its own write
+REPLICA_PIN_SECONDS = config("REPLICA_PIN_SECONDS", default=5, cast=int)
+
 
 # Password validation
 
@@ -122,3 +165,72 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+# Skip the filesystem existence check for media files (originals and resized
+# derivatives) and trust the database
+MEDIA_TRUST_DATABASE = config("MEDIA_TRUST_DATABASE", default=False, cast=bool)
+MEDIA_URL_CACHE_SIZE = config("MEDIA_URL_CACHE_SIZE", default=4096, cast=int)
+MEDIA_MISSING_TTL = config("MEDIA_MISSING_TTL", default=30, cast=int)
+
+# Per-view metrics at /metrics (Prometheus text format). DB and template
+# timings are collected for METRICS_SAMPLE_RATE of requests; with
+# METRICS_DIR set, worker processes share their counters through files there.
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+METRICS_SAMPLE_RATE = config("METRICS_SAMPLE_RATE", default=0.05, cast=float)
+METRICS_DIR = config("METRICS_DIR", default="") or None
+METRICS_TOKEN = config("METRICS_TOKEN", default="") or None
+
+# Outgoing mail is sent by background workers (manage.py run_workers)
+EMAIL_BACKEND = config(
+    "EMAIL_BACKEND", default="django.core.mail.backends.smtp.EmailBackend"
+)
+EMAIL_HOST = config("EMAIL_HOST", default="localhost")
+EMAIL_PORT = config("EMAIL_PORT", default=25, cast=int)
+EMAIL_HOST_USER = config("EMAIL_HOST_USER", default="")
+EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD", default="")
+EMAIL_USE_TLS = config("EMAIL_USE_TLS", default=False, cast=bool)
+EMAIL_TIMEOUT = config("EMAIL_TIMEOUT", default=10, cast=int)
+DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL", default="shop@imperial-gems.local")
+# Where contact form messages go (defaults to DEFAULT_FROM_EMAIL)
+CONTACT_EMAIL = config("CONTACT_EMAIL", default="")
+
+# Caches. Page versions, throttle buckets, stock levels and facet counts must
+# be shared by all workers: set CACHE_URL to redis://host:6379/0 or
+# memcached://host:11211. Without it each process gets its own local memory
+# cache, which is only fit for development. Rendered guest pages live in a
+# separate "pages" cache so they cannot evict the rest.
+CACHE_URL = config("CACHE_URL", default="")
+
+
+def _cache(location, prefix, max_entries):
+    if location.startswith(("redis://", "rediss://")):
+        return {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": location,
+            "KEY_PREFIX": prefix,
+        }
+    if location.startswith("memcached://"):
+        return {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": location.removeprefix("memcached://"),
+            "KEY_PREFIX": prefix,
+        }
+    return {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": prefix,
+        "OPTIONS": {"MAX_ENTRIES": max_entries},
+    }
+
+
+CACHES = {
+    "default": _cache(CACHE_URL, "jewelry", 10_000),
+    "pages": _cache(CACHE_URL, "pages", 2_000),
+}
+
+# Login/registration throttling (token buckets in the cache below; use a
+# shared cache such as Redis or Memcached so limits hold across workers)
+THROTTLE_ENABLED = config("THROTTLE_ENABLED", default=True, cast=bool)
+THROTTLE_CACHE = "default"
+THROTTLE_TRUST_X_FORWARDED_FOR = config(
+    "THROTTLE_TRUST_X_FORWARDED_FOR", default=False, cast=bool
+)